@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_caches():
+    """Общий кэш pytest-прогона в своём временном файле."""
+    from core.testing import isolated_caches
+
+    with isolated_caches():
+        yield
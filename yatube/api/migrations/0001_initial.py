@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Token',
+            fields=[
+                ('pub_date', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_tokens', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Токен API',
+                'verbose_name_plural': 'Токены API',
+            },
+        ),
+    ]
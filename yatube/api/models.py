@@ -0,0 +1,45 @@
+import hashlib
+import secrets
+
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from core.models import CreatedModel
+
+User = get_user_model()
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class Token(CreatedModel):
+    """Токен мобильного клиента для заголовка Authorization: Token.
+
+    В базе лежит только SHA-256 токена: утечка таблицы не даёт
+    войти от имени пользователя.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='api_tokens',
+        verbose_name='Пользователь',
+    )
+
+    class Meta:
+        verbose_name = 'Токен API'
+        verbose_name_plural = 'Токены API'
+
+    @classmethod
+    def issue(cls, user):
+        """Создаёт токен и возвращает его; повторно его не узнать."""
+        key = secrets.token_hex(20)
+        cls.objects.create(digest=_digest(key), user=user)
+        return key
+
+    @classmethod
+    def lookup(cls, key):
+        """Токен по значению из заголовка или None."""
+        return cls.objects.select_related('user').filter(
+            digest=_digest(key), user__is_active=True).first()
@@ -0,0 +1,64 @@
+"""Представление моделей в JSON.
+
+Каждое поле - функция от объекта, так что ?fields= просто выбирает
+нужные функции, а view по тому же списку решает, что подтягивать
+из БД.
+"""
+from django.core.exceptions import ValidationError
+
+
+def _group(group):
+    if group is None:
+        return None
+    return {'id': group.pk, 'slug': group.slug, 'title': group.title}
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: _group(post.group),
+    'image': lambda post: post.image.url if post.image else None,
+    'thumbnails': lambda post: post.thumbnail_urls,
+    'comment_count': lambda post: post.comment_count,
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'text': lambda comment: comment.text,
+    'pub_date': lambda comment: comment.pub_date.isoformat(),
+    'author': lambda comment: comment.author.username,
+}
+
+GROUP_FIELDS = {
+    'id': lambda group: group.pk,
+    'slug': lambda group: group.slug,
+    'title': lambda group: group.title,
+    'description': lambda group: group.description,
+}
+
+FOLLOW_FIELDS = {
+    'author': lambda follow: follow.author.username,
+}
+
+
+def parse_fields(value, available):
+    """Список полей из ?fields=id,text; пустое значение - все поля."""
+    if not value:
+        return tuple(available)
+    fields = tuple(dict.fromkeys(
+        name.strip() for name in value.split(',') if name.strip()
+    ))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValidationError(
+            'Неизвестные поля: %(fields)s',
+            params={'fields': ', '.join(unknown)},
+        )
+    return fields
+
+
+def serialize(obj, available, fields):
+    return {name: available[name](obj) for name in fields}
@@ -0,0 +1,257 @@
+import gzip
+import json
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_PER_PAGE=3)
+class ApiTest(TestCase):
+    """Класс проверки JSON API"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[-1], author=cls.reader, text='Коммент')
+        cls.url_posts = reverse('api:posts')
+        cls.url_post = reverse(
+            'api:post_detail', kwargs={'post_id': cls.posts[-1].pk})
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json')
+
+    def test_posts_cursor_pagination(self):
+        """Список постов листается курсором по ссылке next"""
+
+        texts = []
+        url = self.url_posts
+        while url:
+            data = self.guest_client.get(url).json()
+            texts += [post['text'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(texts, [f'Пост {i}' for i in range(4, -1, -1)])
+
+    def test_post_representation(self):
+        """Пост отдаётся со всеми полями и числом комментариев"""
+
+        data = self.guest_client.get(self.url_post).json()
+        self.assertEqual(data['text'], 'Пост 4')
+        self.assertEqual(data['author'], 'auth')
+        self.assertEqual(data['group']['slug'], 'test-slug')
+        self.assertEqual(data['comment_count'], 1)
+        self.assertIsNone(data['image'])
+
+    def test_sparse_fieldsets(self):
+        """?fields= сужает ответ и не подтягивает лишнее из БД"""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                self.url_posts, {'fields': 'id,text'})
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'text'})
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+        self.assertNotIn('posts_comment', queries[-1]['sql'])
+        response = self.guest_client.get(
+            self.url_posts, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_list_query_count(self):
+        """Число запросов списка не зависит от числа постов"""
+
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(self.url_posts)
+        self.assertEqual(
+            len([query for query in queries if 'posts_post' in query['sql']]),
+            1,
+        )
+
+    def test_etag_and_gzip(self):
+        """Неизменившийся ответ отдаётся 304, большой - сжатым"""
+
+        response = self.guest_client.get(
+            self.url_posts, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            json.loads(gzip.decompress(response.content))['results'][0][
+                'text'],
+            'Пост 4',
+        )
+        response = self.guest_client.get(
+            self.url_posts, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_create_post_uses_form_validation(self):
+        """Создание поста проверяется PostForm"""
+
+        response = self.send(
+            self.author_client, 'post', self.url_posts, {'text': ''})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('text', response.json()['detail'])
+        response = self.send(
+            self.author_client, 'post', self.url_posts,
+            {'text': 'Новый пост', 'group': self.group.pk},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()['group']['slug'], 'test-slug')
+        self.assertTrue(Post.objects.filter(
+            text='Новый пост', author=self.author).exists())
+
+    def test_anonymous_cannot_write(self):
+        """Аноним получает 401 на запись"""
+
+        response = self.send(
+            self.guest_client, 'post', self.url_posts, {'text': 'Пост'})
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_patch_and_delete_post(self):
+        """Автор меняет и удаляет пост, остальные - нет"""
+
+        post = Post.objects.create(
+            author=self.author, text='Черновик', group=self.group)
+        url = reverse('api:post_detail', kwargs={'post_id': post.pk})
+        response = self.send(
+            self.reader_client, 'patch', url, {'text': 'Чужая правка'})
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        response = self.send(
+            self.author_client, 'patch', url, {'text': 'Правка'})
+        self.assertEqual(response.json()['text'], 'Правка')
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Правка')
+        self.assertEqual(post.group, self.group)
+        response = self.author_client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+
+    def test_comments(self):
+        """Комментарии читаются и создаются через CommentForm"""
+
+        url = reverse(
+            'api:post_comments', kwargs={'post_id': self.posts[-1].pk})
+        data = self.guest_client.get(url).json()
+        self.assertEqual(
+            [(item['author'], item['text']) for item in data['results']],
+            [('reader', 'Коммент')],
+        )
+        response = self.send(
+            self.author_client, 'post', url, {'text': 'Ответ'})
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        data = self.guest_client.get(url).json()
+        self.assertEqual(len(data['results']), 2)
+
+    def test_groups(self):
+        """Группы отдаются списком и по slug"""
+
+        data = self.guest_client.get(reverse('api:groups')).json()
+        self.assertEqual(data['results'][0]['slug'], 'test-slug')
+        response = self.guest_client.get(
+            reverse('api:group_detail', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(response.json()['detail'], 'Не найдено')
+
+    def test_follows_and_feed(self):
+        """Подписка через API наполняет ленту"""
+
+        response = self.send(
+            self.reader_client, 'post', reverse('api:follows'),
+            {'author': 'auth'},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        data = self.reader_client.get(reverse('api:follows')).json()
+        self.assertEqual(data['results'], [{'author': 'auth'}])
+        data = self.reader_client.get(reverse('api:feed')).json()
+        self.assertEqual(data['results'][0]['text'], 'Пост 4')
+        response = self.reader_client.delete(
+            reverse('api:follow_detail', kwargs={'username': 'auth'}))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_method_not_allowed(self):
+        """Неподдерживаемый метод получает 405 с Allow"""
+
+        response = self.author_client.put(reverse('api:groups'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+        self.assertIn('GET', response['Allow'])
+
+    def test_session_write_without_csrf_gets_json(self):
+        """Запись по сессии без CSRF-токена получает 403 в JSON"""
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = self.send(client, 'post', self.url_posts, {'text': 'Без'})
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('CSRF', response.json()['detail'])
+        self.assertFalse(Post.objects.filter(text='Без').exists())
+
+    def test_token_auth(self):
+        """Клиент с токеном пишет без cookie и CSRF"""
+
+        self.author.set_password('пароль')
+        self.author.save()
+        client = Client(enforce_csrf_checks=True)
+        response = self.send(client, 'post', reverse('api:token'), {
+            'username': 'auth', 'password': 'пароль'})
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        header = {'HTTP_AUTHORIZATION': f'Token {response.json()["token"]}'}
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, client.cookies)
+        response = client.post(
+            self.url_posts, json.dumps({'text': 'С токеном'}),
+            content_type='application/json', **header)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()['author'], 'auth')
+        response = client.delete(reverse('api:token'), **header)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        response = client.get(reverse('api:feed'), **header)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_token_wrong_password(self):
+        """Неверный пароль не даёт токен"""
+
+        response = self.send(
+            Client(enforce_csrf_checks=True), 'post', reverse('api:token'),
+            {'username': 'auth', 'password': 'нет'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
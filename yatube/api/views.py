@@ -0,0 +1,380 @@
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+
+from core.conditional import conditional_page
+from core.db import retry_on_locked
+from core.page_cache import add_surrogate_keys, cache_anonymous_page
+from core.paginator import CursorPaginator
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.surrogate import (INDEX, author_key, group_key, listing_keys,
+                             post_key)
+from posts.thumbnails import schedule_thumbnails
+from posts.timeline import Timeline, TimelineCursorPaginator
+from .models import Token
+from .serializers import (COMMENT_FIELDS, FOLLOW_FIELDS, GROUP_FIELDS,
+                          POST_FIELDS, parse_fields, serialize)
+
+# Кириллица в ответе вдвое короче, чем в виде \uXXXX.
+JSON_PARAMS = {'ensure_ascii': False}
+TOKEN_PREFIX = 'Token '
+
+
+class ApiError(Exception):
+    """Ошибка запроса, которую api_view превращает в JSON-ответ."""
+
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+class _CsrfCheck(CsrfViewMiddleware):
+    """Проверка CSRF, которая возвращает причину отказа, а не HTML."""
+
+    def _reject(self, request, reason):
+        return reason
+
+
+def _authenticate(request):
+    """Пользователь запроса по заголовку Authorization: Token.
+
+    Без токена остаётся пользователь сессии, и тогда запись, как и
+    в формах сайта, требует CSRF-токен: cookie сессии браузер
+    отправит и со страницы чужого сайта.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith(TOKEN_PREFIX):
+        token = Token.lookup(header[len(TOKEN_PREFIX):].strip())
+        if token is None:
+            raise ApiError(401, 'Недействительный токен')
+        request.user = token.user
+        request.api_token = token
+        return
+    if not request.user.is_authenticated:
+        return
+    check = _CsrfCheck()
+    check.process_request(request)
+    reason = check.process_view(request, None, (), {})
+    if reason:
+        raise ApiError(403, f'Ошибка CSRF: {reason}')
+
+
+def api_view(*methods):
+    """Проверяет метод запроса и отдаёт ошибки в JSON, а не HTML.
+
+    CSRF для сессии проверяет _authenticate, чтобы и отказ пришёл
+    в JSON; запросы с токеном в проверке не нуждаются.
+    """
+    if 'GET' in methods:
+        methods += ('HEAD',)
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = _json({'detail': 'Метод не поддерживается'}, 405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                _authenticate(request)
+                return view(request, *args, **kwargs)
+            except Http404:
+                return _json({'detail': 'Не найдено'}, 404)
+            except ApiError as error:
+                return _json({'detail': error.detail}, error.status)
+        return wrapper
+    return decorator
+
+
+def _require_login(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Требуется авторизация')
+
+
+def _fields(request, available):
+    try:
+        return parse_fields(request.GET.get('fields'), available)
+    except ValidationError as error:
+        raise ApiError(400, error.messages[0])
+
+
+def _request_data(request):
+    """Данные и файлы запроса из JSON, multipart или urlencoded тела."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ApiError(400, 'Некорректный JSON')
+        if not isinstance(data, dict):
+            raise ApiError(400, 'Ожидается JSON-объект')
+        return data, None
+    if request.method == 'POST':
+        return request.POST.dict(), request.FILES
+    # Django разбирает тело только у POST.
+    if request.content_type == 'multipart/form-data':
+        data, files = request.parse_file_upload(request.META, request)
+        return data.dict(), files
+    return QueryDict(request.body).dict(), None
+
+
+def _validate(form):
+    if not form.is_valid():
+        raise ApiError(400, {
+            field: [error['message'] for error in errors]
+            for field, errors in form.errors.get_json_data().items()
+        })
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def _page_response(request, page, available, fields):
+    return _json({
+        'results': [serialize(obj, available, fields) for obj in page],
+        'next': _page_url(request, page.next_cursor),
+        'previous': _page_url(request, page.previous_cursor),
+    })
+
+
+def _posts(fields, queryset=None):
+    """Посты с JOIN и подзапросами только для запрошенных полей."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    related = [name for name in ('author', 'group') if name in fields]
+    if related:
+        queryset = queryset.select_related(*related)
+    if 'comment_count' in fields:
+        queryset = queryset.with_comment_count()
+    return queryset
+
+
+def _post_response(post, status=200):
+    post = Post.objects.for_listing().get(pk=post.pk)
+    return _json(serialize(post, POST_FIELDS, POST_FIELDS), status)
+
+
+@retry_on_locked
+@transaction.atomic
+def _create_post(request):
+    _require_login(request)
+    data, files = _request_data(request)
+    form = PostForm(data, files)
+    _validate(form)
+    post = form.save(commit=False)
+    post.author = request.user
+    post.save()
+    schedule_thumbnails(post)
+    return _post_response(post, 201)
+
+
+@retry_on_locked
+@transaction.atomic
+def _edit_post(request, post):
+    data, files = _request_data(request)
+    # PATCH меняет только переданные поля, форме нужны и остальные.
+    data = {**model_to_dict(post, fields=('text', 'group')), **data}
+    form = PostForm(data, files, instance=post)
+    _validate(form)
+    post = form.save(commit=False)
+    if 'image' in form.changed_data:
+        post.thumbnails = ''
+        schedule_thumbnails(post)
+    post.save()
+    return _post_response(post)
+
+
+@gzip_page
+@api_view('GET', 'POST')
+@conditional_page()
+@cache_anonymous_page
+def posts(request):
+    if request.method == 'POST':
+        return _create_post(request)
+    fields = _fields(request, POST_FIELDS)
+    queryset = _posts(fields)
+    if request.GET.get('group'):
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    page = CursorPaginator(queryset, settings.POSTS_PER_PAGE).get_page(
+        request.GET.get('cursor'))
+    keys = {post_key(post.pk) for post in page}
+    if 'group' in fields:
+        keys |= listing_keys(page)
+    add_surrogate_keys(request, INDEX, *keys)
+    return _page_response(request, page, POST_FIELDS, fields)
+
+
+@gzip_page
+@api_view('GET', 'PATCH', 'DELETE')
+@conditional_page()
+@cache_anonymous_page
+def post_detail(request, post_id):
+    if request.method in ('GET', 'HEAD'):
+        fields = _fields(request, POST_FIELDS)
+        post = get_object_or_404(_posts(fields), pk=post_id)
+        add_surrogate_keys(
+            request,
+            post_key(post.pk),
+            author_key(post.author_id),
+            group_key(post.group.slug if 'group' in fields and post.group
+                      else None),
+        )
+        return _json(serialize(post, POST_FIELDS, fields))
+    _require_login(request)
+    post = get_object_or_404(Post, pk=post_id)
+    if post.author_id != request.user.pk:
+        raise ApiError(403, 'Менять пост может только автор')
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    return _edit_post(request, post)
+
+
+@retry_on_locked
+@transaction.atomic
+def _create_comment(request, post):
+    _require_login(request)
+    form = CommentForm(_request_data(request)[0])
+    _validate(form)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    comment.save()
+    return _json(serialize(comment, COMMENT_FIELDS, COMMENT_FIELDS), 201)
+
+
+@gzip_page
+@api_view('GET', 'POST')
+@conditional_page()
+@cache_anonymous_page
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if request.method == 'POST':
+        return _create_comment(request, post)
+    fields = _fields(request, COMMENT_FIELDS)
+    comments = Comment.objects.filter(post=post)
+    if 'author' in fields:
+        comments = comments.select_related('author')
+    page = CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, ordering=('pub_date', 'id')
+    ).get_page(request.GET.get('cursor'))
+    add_surrogate_keys(request, post_key(post.pk))
+    return _page_response(request, page, COMMENT_FIELDS, fields)
+
+
+@gzip_page
+@api_view('GET')
+@conditional_page()
+def groups(request):
+    fields = _fields(request, GROUP_FIELDS)
+    page = CursorPaginator(
+        Group.objects.all(), settings.POSTS_PER_PAGE, ordering=('id',)
+    ).get_page(request.GET.get('cursor'))
+    return _page_response(request, page, GROUP_FIELDS, fields)
+
+
+@gzip_page
+@api_view('GET')
+@conditional_page()
+def group_detail(request, slug):
+    fields = _fields(request, GROUP_FIELDS)
+    group = get_object_or_404(Group, slug=slug)
+    return _json(serialize(group, GROUP_FIELDS, fields))
+
+
+@gzip_page
+@api_view('GET')
+def feed(request):
+    """Лента подписок. Подписки не меняют поколение контента,
+    поэтому ETag здесь не проверяется."""
+    _require_login(request)
+    fields = _fields(request, POST_FIELDS)
+    page = TimelineCursorPaginator(
+        Timeline(request.user, _posts(fields)), settings.POSTS_PER_PAGE
+    ).get_page(request.GET.get('cursor'))
+    return _page_response(request, page, POST_FIELDS, fields)
+
+
+@retry_on_locked
+@transaction.atomic
+def _follow(request):
+    username = _request_data(request)[0].get('author')
+    author = get_object_or_404(User, username=username)
+    if author == request.user:
+        raise ApiError(400, 'Нельзя подписаться на себя')
+    follow, created = Follow.objects.get_or_create(
+        author=author, user=request.user)
+    return _json(
+        serialize(follow, FOLLOW_FIELDS, FOLLOW_FIELDS),
+        201 if created else 200,
+    )
+
+
+@gzip_page
+@api_view('GET', 'POST')
+def follows(request):
+    _require_login(request)
+    if request.method == 'POST':
+        return _follow(request)
+    fields = _fields(request, FOLLOW_FIELDS)
+    page = CursorPaginator(
+        request.user.follower.select_related('author'),
+        settings.POSTS_PER_PAGE,
+        ordering=('-id',),
+    ).get_page(request.GET.get('cursor'))
+    return _page_response(request, page, FOLLOW_FIELDS, fields)
+
+
+@gzip_page
+@api_view('DELETE')
+@retry_on_locked
+@transaction.atomic
+def follow_detail(request, username):
+    _require_login(request)
+    follow = get_object_or_404(
+        Follow, user=request.user, author__username=username)
+    follow.delete()
+    return HttpResponse(status=204)
+
+
+@api_view('POST', 'DELETE')
+def token(request):
+    """POST с username и password выдаёт токен, DELETE отзывает
+    токен, с которым пришёл запрос."""
+    if request.method == 'DELETE':
+        if getattr(request, 'api_token', None) is None:
+            raise ApiError(401, 'Требуется токен')
+        request.api_token.delete()
+        return HttpResponse(status=204)
+    data = _request_data(request)[0]
+    user = authenticate(
+        request,
+        username=data.get('username'),
+        password=data.get('password'),
+    )
+    if user is None:
+        raise ApiError(400, 'Неверное имя пользователя или пароль')
+    return _json({'token': Token.issue(user)}, 201)
@@ -0,0 +1,239 @@
+import hashlib
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import routers
+
+GENERATION_KEY = 'content:generation'
+MODIFIED_KEY = 'content:modified'
+SURROGATE_KEY_PREFIX = 'surrogate:'
+STALE_KEY_PREFIX = 'stale:'
+REPLICA_SYNCED_PREFIX = 'replica:synced:'
+LOCK_SUFFIX = ':lock'
+POLL_INTERVAL = 0.05
+
+_local = threading.local()
+
+
+def _initial_generation():
+    # Стартуем со времени, а не с единицы: если ключ вытеснят из кэша,
+    # новый счётчик не совпадёт со старыми поколениями фрагментов.
+    return int(time.time() * 1000)
+
+
+def get_generation():
+    """Текущее поколение контента, входит в ключи кэша фрагментов."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, _initial_generation(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def get_last_modified():
+    """Время последнего изменения контента.
+
+    Если отметка потерялась, изменения были не позже текущего момента.
+    """
+    timestamp = cache.get(MODIFIED_KEY)
+    if timestamp is None:
+        cache.add(MODIFIED_KEY, time.time(), None)
+        timestamp = cache.get(MODIFIED_KEY)
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def mark_replica_synced(alias, timestamp):
+    """Отмечает, что реплика alias содержит всё записанное до timestamp."""
+    cache.set(REPLICA_SYNCED_PREFIX + alias, timestamp, None)
+
+
+def replica_is_current():
+    """Видны ли с базы, из которой читает поток, все изменения контента.
+
+    Отстающая реплика отдаёт данные до последней записи, а ключи
+    кэша уже сдвинуты: собранное по ней закэшировалось бы под новым
+    поколением и пережило бы саму репликацию.
+    """
+    alias = routers.current_replica()
+    if alias is None:
+        return True
+    synced = cache.get(REPLICA_SYNCED_PREFIX + alias)
+    return synced is not None and synced > get_last_modified().timestamp()
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_generation(), None)
+        return cache.get(key)
+
+
+def _incr_generation():
+    cache.set(MODIFIED_KEY, time.time(), None)
+    return _incr(GENERATION_KEY)
+
+
+def bump_generation():
+    """Делает устаревшими все фрагменты, закэшированные до вызова.
+
+    Внутри транзакции счётчик сдвигается ещё раз после коммита,
+    чтобы фрагмент, собранный по незакоммиченным данным другим
+    запросом, не пережил изменение.
+    """
+    _incr_generation()
+    if connection.in_atomic_block:
+        transaction.on_commit(_incr_generation)
+
+
+def _surrogate_cache_key(surrogate_key):
+    return SURROGATE_KEY_PREFIX + surrogate_key
+
+
+def get_surrogate_versions(surrogate_keys):
+    """Текущие версии суррогатных ключей вида post:1, index."""
+    cache_keys = {
+        _surrogate_cache_key(key): key for key in surrogate_keys
+    }
+    found = cache.get_many(cache_keys)
+    for cache_key in cache_keys.keys() - found.keys():
+        cache.add(cache_key, _initial_generation(), None)
+        found[cache_key] = cache.get(cache_key)
+    return {cache_keys[cache_key]: found[cache_key] for cache_key in found}
+
+
+def _incr_surrogate_keys(surrogate_keys):
+    for key in surrogate_keys:
+        _incr(_surrogate_cache_key(key))
+
+
+def purge_surrogate_keys(*surrogate_keys):
+    """Делает устаревшими закэшированные страницы с этими ключами.
+
+    Как и bump_generation, внутри транзакции повторяется после
+    коммита.
+    """
+    surrogate_keys = [key for key in surrogate_keys if key]
+    _incr_surrogate_keys(surrogate_keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(
+            lambda: _incr_surrogate_keys(surrogate_keys))
+
+
+def _is_fresh(entry, version, beta):
+    """Свежа ли запись с учётом вероятностного раннего обновления.
+
+    Чем дольше считалось значение и чем ближе мягкий срок, тем выше
+    шанс, что запрос обновит его заранее (алгоритм XFetch).
+    """
+    _, entry_version, soft_expires, delta = entry
+    if entry_version != version:
+        return False
+    early = -delta * beta * math.log(1 - random.random())
+    return time.time() + early < soft_expires
+
+
+def _compute(key, compute, timeout, hard_timeout, version):
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    cache.set(
+        key, (value, version, time.time() + timeout, delta), hard_timeout)
+    return value
+
+
+def _wait_for_value(key):
+    """Ждёт, пока значение посчитает держатель блокировки."""
+    deadline = time.time() + settings.STALE_CACHE_WAIT
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def reset_stale_served():
+    """Начинает учёт значений старой версии в текущем потоке."""
+    _local.stale_served = False
+
+
+def stale_served():
+    """Отдал ли get_or_compute после reset_stale_served() значение
+    другой версии. Страницу с таким значением нельзя кэшировать и
+    помечать ETag нового поколения: она собрана из старого."""
+    return getattr(_local, 'stale_served', False)
+
+
+def _served(entry, version):
+    if entry[1] != version:
+        _local.stale_served = True
+    return entry[0]
+
+
+def get_or_compute(key, compute, timeout, hard_timeout=None, version=None):
+    """Значение из кэша с защитой от одновременного пересчёта.
+
+    До мягкого срока timeout значение отдаётся как есть. После него
+    (или при другом version) его пересчитывает один запрос, взявший
+    блокировку в кэше, а остальные до жёсткого срока hard_timeout
+    отдают старое значение. Если значения нет вовсе, остальные
+    недолго ждут результата и только потом считают сами. Пока
+    реплика запроса не догнала основную базу, значение считается
+    без записи в кэш. Отданное старой версии отмечает stale_served.
+    """
+    if hard_timeout is None:
+        hard_timeout = timeout * settings.STALE_CACHE_HARD_FACTOR
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(
+            entry, version, settings.STALE_CACHE_BETA):
+        return entry[0]
+    if not replica_is_current():
+        return compute()
+
+    lock_key = key + LOCK_SUFFIX
+    if not cache.add(lock_key, True, settings.STALE_CACHE_LOCK_TIMEOUT):
+        if entry is None:
+            entry = _wait_for_value(key)
+        if entry is not None:
+            return _served(entry, version)
+        # Держатель блокировки не успел: считаем без неё.
+        return _compute(key, compute, timeout, hard_timeout, version)
+    try:
+        return _compute(key, compute, timeout, hard_timeout, version)
+    finally:
+        cache.delete(lock_key)
+
+
+def stale_while_revalidate(timeout, hard_timeout=None, version=None):
+    """Декоратор get_or_compute для функций с хэшируемыми аргументами.
+
+    version - функция без аргументов, например get_generation: при
+    смене её значения результат пересчитывается, но до пересчёта
+    остальные вызовы получают старый.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            arguments = repr((args, sorted(kwargs.items()))).encode()
+            key = '{}{}:{}'.format(
+                STALE_KEY_PREFIX, name, hashlib.md5(arguments).hexdigest())
+            return get_or_compute(
+                key,
+                lambda: func(*args, **kwargs),
+                timeout,
+                hard_timeout,
+                version() if version else None,
+            )
+        return wrapper
+    return decorator
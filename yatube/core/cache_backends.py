@@ -0,0 +1,449 @@
+import atexit
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, suppress
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+# Как и у LocMemCache, локальный уровень общий для всех потоков
+# процесса: django.core.cache.caches создаёт бэкенд на каждый поток.
+_stores = {}
+_stores_lock = threading.Lock()
+# Файлы SQLiteCache, схема которых уже создана в этом процессе.
+_schemas = set()
+
+
+def _remove_files(path):
+    for suffix in ('', '-wal', '-shm'):
+        with suppress(FileNotFoundError):
+            os.remove(path + suffix)
+
+
+class LocalStore:
+    """LRU в памяти процесса с TTL и ограничением по размеру в байтах.
+
+    Значения хранятся сериализованными: так их размер известен
+    точно, а вызывающий получает копию, как и из общего кэша.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.last_change = None
+        self.next_sync = 0
+        self.stats = dict.fromkeys(
+            ('local_hits', 'local_misses', 'shared_hits', 'shared_misses'),
+            0,
+        )
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            data, expires = entry
+            if expires <= time.monotonic():
+                self._pop(key)
+                return _MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key, value, ttl):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._pop(key)
+            if ttl <= 0 or len(data) > self.max_bytes:
+                return
+            self.entries[key] = (data, time.monotonic() + ttl)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+class SQLiteCache(BaseCache):
+    """Общий для процессов кэш в файле SQLite.
+
+    add и incr - одна SQL-команда каждая, поэтому атомарны между
+    процессами: add - INSERT ... ON CONFLICT, который заменяет только
+    истёкшую запись, incr - UPDATE value = value + delta (целые числа
+    хранятся как INTEGER, остальное - pickle). Каждая запись попадает
+    в журнал изменений, по которому TwoTierCache сбрасывает в своём
+    локальном уровне только изменённые ключи.
+
+    LOCATION - путь к файлу. OPTIONS:
+        TEMPORARY - удалить файл при выходе из процесса (для тестов);
+        CHANGES_RETENTION - сколько секунд хранить журнал изменений;
+        TIMEOUT - сколько секунд ждать блокировку записи.
+    """
+
+    CULL_EVERY = 256
+    # Изменений больше, чем стоит перечислять: проще сбросить всё.
+    MAX_CHANGES = 10000
+    CLEAR_ALL = '*'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.changes_retention = options.get('CHANGES_RETENTION', 600)
+        self.busy_timeout = options.get('TIMEOUT', 5)
+        self.writes = 0
+        self._connection = None
+        self._pid = None
+        with _stores_lock:
+            if location not in _schemas:
+                self._create(options.get('TEMPORARY', False))
+                _schemas.add(location)
+
+    def _create(self, temporary):
+        directory = os.path.dirname(self.location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if temporary:
+            atexit.register(_remove_files, self.location)
+        with self._transaction() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, '
+                'value BLOB, expires REAL) WITHOUT ROWID')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS changes (id INTEGER PRIMARY '
+                'KEY AUTOINCREMENT, key TEXT NOT NULL, changed REAL NOT NULL)')
+
+    @property
+    def db(self):
+        # После fork соединение родителя использовать нельзя.
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(
+                self.location, timeout=self.busy_timeout,
+                isolation_level=None, check_same_thread=False,
+            )
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+        return self._connection
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция записи: BEGIN IMMEDIATE сразу берёт блокировку."""
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    @staticmethod
+    def _encode(value):
+        # bool - тоже int, но должен вернуться bool.
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def _changed(self, db, key):
+        db.execute('INSERT INTO changes (key, changed) VALUES (?, ?)',
+                   (key, time.time()))
+        self.writes += 1
+        if self.writes % self.CULL_EVERY == 0:
+            self._cull(db)
+
+    def _cull(self, db):
+        now = time.time()
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        db.execute('DELETE FROM changes WHERE changed < ?',
+                   (now - self.changes_retention,))
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,))
+
+    def _key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        found = {}
+        names = list(made)
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            rows = self.db.execute(
+                'SELECT key, value FROM cache WHERE key IN (%s) '
+                'AND (expires IS NULL OR expires > ?)'
+                % ', '.join('?' * len(chunk)),
+                (*chunk, time.time()),
+            )
+            for name, value in rows:
+                found[made[name]] = self._decode(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            self._insert(db, 'REPLACE', key, value, timeout)
+            self._changed(db, key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        # BEGIN IMMEDIATE держит блокировку записи, поэтому удаление
+        # истёкшего значения и вставка никем не перемежаются.
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache WHERE key = ? AND expires <= ?',
+                       (key, time.time()))
+            added = self._insert(db, 'IGNORE', key, value, timeout)
+            if added:
+                self._changed(db, key)
+        return bool(added)
+
+    def _insert(self, db, conflict, key, value, timeout):
+        # Без UPSERT и RETURNING: им нужен SQLite 3.24 и 3.35, а
+        # Python может быть собран со старой libsqlite3.
+        return db.execute(
+            f'INSERT OR {conflict} INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, self._encode(value), self.get_backend_timeout(timeout)),
+        ).rowcount
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE cache SET value = value + ? WHERE key = ? "
+                "AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, key, time.time()),
+            ).rowcount
+            if not updated:
+                raise ValueError(f"Key '{key}' not found")
+            value, = db.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+            self._changed(db, key)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            return bool(db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount)
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self._changed(db, key)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version)
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache')
+            self._changed(db, self.CLEAR_ALL)
+
+    def last_change(self):
+        """Номер последней записи в журнале изменений."""
+        row = self.db.execute('SELECT MAX(id) FROM changes').fetchone()
+        return row[0] or 0
+
+    def changes_since(self, change):
+        """Ключи, изменённые после записи журнала change.
+
+        Возвращает (номер последней записи, ключи) или (номер, None),
+        если журнал не позволяет перечислить изменения: часть уже
+        удалена, их слишком много или был clear().
+        """
+        rows = self.db.execute(
+            'SELECT id, key FROM changes WHERE id > ? ORDER BY id LIMIT ?',
+            (change, self.MAX_CHANGES + 1),
+        ).fetchall()
+        if not rows:
+            return change, set()
+        keys = {key for _, key in rows}
+        if (rows[0][0] != change + 1 or len(rows) > self.MAX_CHANGES
+                or self.CLEAR_ALL in keys):
+            return self.last_change(), None
+        return rows[-1][0], keys
+
+    def close(self, **kwargs):
+        # Django закрывает кэши после каждого запроса, а соединение
+        # с файлом дешевле держать открытым.
+        pass
+
+
+class TwoTierCache(BaseCache):
+    """Локальный LRU процесса перед общим для воркеров бэкендом.
+
+    Запись идёт в оба уровня. Раз в SYNC_INTERVAL секунд процесс
+    читает из журнала общего бэкенда ключи, изменённые с прошлой
+    сверки, и удаляет из своего LRU только их: чужие изменения видны
+    не позже чем через SYNC_INTERVAL, свои - сразу, а запись одного
+    ключа не сбрасывает остальные. add и incr атомарно выполняет
+    общий бэкенд, поэтому им нужен бэкенд с журналом изменений,
+    например SQLiteCache.
+
+    OPTIONS:
+        SHARED - алиас общего бэкенда из CACHES;
+        MAX_BYTES - предел размера локального уровня;
+        LOCAL_TIMEOUT - сколько секунд значение живёт локально;
+        SYNC_INTERVAL - как часто читать журнал изменений.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self.sync_interval = options.get('SYNC_INTERVAL', 1)
+        with _stores_lock:
+            self.local = _stores.setdefault(
+                location or self.shared_alias,
+                LocalStore(options.get('MAX_BYTES', 16 * 1024 * 1024)),
+            )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _sync(self):
+        now = time.monotonic()
+        if now < self.local.next_sync:
+            return
+        self.local.next_sync = now + self.sync_interval
+        if self.local.last_change is None:
+            # До первой сверки локально лежат только свои записи.
+            self.local.last_change = self.shared.last_change()
+            return
+        last_change, keys = self.shared.changes_since(self.local.last_change)
+        if keys is None:
+            self.local.clear()
+        else:
+            for key in keys:
+                self.local.delete(key)
+        self.local.last_change = last_change
+
+    def _local_key(self, key, version):
+        # Ключи локального уровня совпадают с ключами журнала.
+        key = self.shared.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def _local_ttl(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout - time.time(), self.local_timeout)
+
+    def _shared_timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _count(self, name):
+        with self.local.lock:
+            self.local.stats[name] += 1
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        self._sync()
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            self._count('local_hits')
+            return value
+        self._count('local_misses')
+        synced = self.local.last_change
+        value = self.shared.get(key, _MISSING, version)
+        if value is _MISSING:
+            self._count('shared_misses')
+            return default
+        self._count('shared_hits')
+        # Другой поток сверил журнал, пока шло чтение: значение могло
+        # устареть, а его изменение уже пропущено.
+        if self.local.last_change == synced:
+            self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        self.shared.set(key, value, self._shared_timeout(timeout), version)
+        self.local.set(local_key, value, self._local_ttl(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        # Локальная копия могла устареть, раз ключ уже занят.
+        self.local.delete(local_key)
+        if not self.shared.add(
+                key, value, self._shared_timeout(timeout), version):
+            return False
+        self.local.set(local_key, value, self._local_ttl(timeout))
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self._local_key(key, version)
+        try:
+            value = self.shared.incr(key, delta, version)
+        except ValueError:
+            self.local.delete(local_key)
+            raise
+        self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.touch(key, self._shared_timeout(timeout), version)
+
+    def delete(self, key, version=None):
+        local_key = self._local_key(key, version)
+        self.shared.delete(key, version)
+        self.local.delete(local_key)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def stats(self):
+        """Попадания и промахи по уровням с долей попаданий."""
+        stats = dict(self.local.stats)
+        for tier in ('local', 'shared'):
+            hits = stats[f'{tier}_hits']
+            total = hits + stats[f'{tier}_misses']
+            stats[f'{tier}_hit_ratio'] = hits / total if total else 0
+        stats['local_bytes'] = self.local.size
+        return stats
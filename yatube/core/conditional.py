@@ -0,0 +1,58 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .cache import (get_generation, get_last_modified, reset_stale_served,
+                    stale_served)
+
+
+def conditional_page(extra=None):
+    """Условный GET для страниц, собранных из постов.
+
+    ETag складывается из поколения контента, пользователя и полного
+    адреса запроса, поэтому для неизменившейся страницы view не
+    вызывается и отдаётся 304. extra(request, *args, **kwargs)
+    добавляет в ETag то, что зависит не только от контента (например,
+    подписан ли пользователь на автора).
+
+    Last-Modified отдаётся только анонимам: время последнего изменения
+    контента не учитывает состояние, видное вошедшему пользователю.
+    Если страницу собрали из фрагмента старого поколения, пока его
+    пересчитывал другой запрос, ни ETag, ни Last-Modified она не
+    получает: иначе браузер получал бы 304 на старую страницу.
+    """
+    def etag(request, *args, **kwargs):
+        user = request.user
+        parts = [
+            get_generation(),
+            user.pk if user.is_authenticated else None,
+            request.get_full_path(),
+        ]
+        if extra is not None:
+            parts.append(extra(request, *args, **kwargs))
+        return hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return get_last_modified()
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified)(view)
+
+        def wrapper(request, *args, **kwargs):
+            reset_stale_served()
+            response = conditional_view(request, *args, **kwargs)
+            if stale_served():
+                del response['ETag']
+                del response['Last-Modified']
+            # Страница зависит от сессии, а закэшированную копию
+            # браузер обязан проверять у сервера перед показом.
+            patch_vary_headers(response, ('Cookie',))
+            if not response.has_header('Cache-Control'):
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wraps(view)(wrapper)
+    return decorator
@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from core.cache import get_generation
+
+
+def fragment_cache(request):
+    return {
+        'content_generation': SimpleLazyObject(get_generation),
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,64 @@
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Выставляет SQLITE_PRAGMAS каждому новому соединению с SQLite.
+
+    Подключается к сигналу connection_created в CoreConfig.ready.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+def retry_on_locked(func):
+    """Повторяет запись, которую SQLite отклонил с «database is locked».
+
+    busy_timeout ждёт чужую запись сам, но транзакция, которая
+    начала с чтения и затем пишет, получает отказ сразу, если базу
+    успел изменить другой процесс. Такую транзакцию можно только
+    начать заново, поэтому повторяется вся функция - с задержкой,
+    растущей вдвое, не больше DB_LOCKED_RETRIES раз. Внутри внешней
+    транзакции повторять нечего: ошибка уходит вызывающему.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        for attempt in range(settings.DB_LOCKED_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_locked(error):
+                    raise
+                delay = settings.DB_LOCKED_RETRY_DELAY * 2 ** attempt
+                logger.warning('%s: база заблокирована, повтор через %.3f с',
+                               func.__qualname__, delay)
+                time.sleep(delay * random.uniform(1, 1.5))
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def replicate(source, target):
+    """Копирует базу SQLite source в target онлайн-бэкапом.
+
+    Подставка вместо настоящей репликации: копия консистентна,
+    а читатели target ждут её окончания в пределах busy_timeout.
+    """
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
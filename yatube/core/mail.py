@@ -0,0 +1,33 @@
+import base64
+import copy
+import pickle
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .tasks import PRIORITY_HIGH, enqueue
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Почтовый бэкенд, который только ставит письма в очередь.
+
+    Письмо отправляет run_worker через TASK_EMAIL_BACKEND, так что
+    запрос не ждёт почтовый сервер.
+    """
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            message = copy.copy(message)
+            message.connection = None
+            # Письмо сохраняется целиком, с вложениями и HTML-версией.
+            data = base64.b64encode(pickle.dumps(message)).decode()
+            enqueue(send_message, data, priority=PRIORITY_HIGH)
+        return len(email_messages)
+
+
+def send_message(data):
+    """Задача очереди: отправляет письмо из QueuedEmailBackend."""
+    message = pickle.loads(base64.b64decode(data))
+    message.connection = get_connection(settings.TASK_EMAIL_BACKEND)
+    message.send()
@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.cache import mark_replica_synced
+from core.db import replicate
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite во все DATABASE_REPLICAS - '
+        'подставка вместо репликации для локального запуска и тестов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование раз в столько секунд '
+                 '(по умолчанию один раз)',
+        )
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        replicas = [connections[alias] for alias in settings.DATABASE_REPLICAS]
+        if not replicas:
+            raise CommandError('DATABASE_REPLICAS пуст')
+        if any(db.vendor != 'sqlite' for db in [primary, *replicas]):
+            raise CommandError('Копирование поддерживается только для SQLite')
+        while True:
+            started = time.monotonic()
+            for replica in replicas:
+                # Копия содержит всё закоммиченное до начала копирования.
+                synced = time.time()
+                replicate(primary, replica)
+                mark_replica_synced(replica.alias, synced)
+            self.stdout.write(
+                f'Реплик обновлено: {len(replicas)} за '
+                f'{time.monotonic() - started:.3f} с'
+            )
+            if not options['interval']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,71 @@
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.tasks import work
+
+
+class Command(BaseCommand):
+    help = 'Выполняет отложенные задачи из очереди core.Task'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=None,
+            help='Сколько потоков выполняют задачи (по умолчанию '
+                 'TASK_WORKERS)',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти',
+        )
+
+    def handle(self, *args, **options):
+        threads = options['threads'] or settings.TASK_WORKERS
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        if threads == 1:
+            done = self.run(f'{name}:0', stop, options['once'])
+        else:
+            done = self.run_threads(name, threads, stop, options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
+
+    def run(self, worker, stop, once):
+        try:
+            return work(worker, stop, once)
+        except KeyboardInterrupt:
+            stop.set()
+            return 0
+
+    def run_threads(self, name, threads, stop, once):
+        results = [0] * threads
+
+        def target(number):
+            try:
+                results[number] = work(f'{name}:{number}', stop, once)
+            finally:
+                # У каждого потока своё соединение с базой.
+                connection.close()
+
+        pool = [
+            threading.Thread(target=target, args=(number,),
+                             name=f'worker-{number}')
+            for number in range(threads)
+        ]
+        for thread in pool:
+            thread.start()
+        try:
+            for thread in pool:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in pool:
+                thread.join()
+        return sum(results)
@@ -0,0 +1,184 @@
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+Metric = namedtuple('Metric', 'name help buckets')
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (
+    1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+
+REQUEST_DURATION = Metric(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса целиком',
+    DURATION_BUCKETS,
+)
+DB_QUERIES = Metric(
+    'yatube_db_queries',
+    'Число SQL-запросов на HTTP-запрос',
+    QUERY_BUCKETS,
+)
+DB_DURATION = Metric(
+    'yatube_db_duration_seconds',
+    'Суммарное время SQL-запросов на HTTP-запрос',
+    DURATION_BUCKETS,
+)
+TEMPLATE_DURATION = Metric(
+    'yatube_template_duration_seconds',
+    'Время рендеринга шаблонов на HTTP-запрос',
+    DURATION_BUCKETS,
+)
+RESPONSE_SIZE = Metric(
+    'yatube_response_size_bytes',
+    'Размер тела ответа',
+    SIZE_BUCKETS,
+)
+METRICS = (
+    REQUEST_DURATION, DB_QUERIES, DB_DURATION, TEMPLATE_DURATION,
+    RESPONSE_SIZE,
+)
+
+
+class Histogram:
+    """Кумулятивная гистограмма в формате Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последняя корзина соответствует le="+Inf".
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """Гистограммы текущего процесса по (метрике, имени view).
+
+    Каждый воркер держит свои значения: Prometheus опрашивает
+    воркеры по отдельности и суммирует ряды сам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, metric, view, value):
+        with self._lock:
+            histogram = self._histograms.get((metric, view))
+            if histogram is None:
+                histogram = Histogram(metric.buckets)
+                self._histograms[metric, view] = histogram
+            histogram.observe(value)
+
+    def get(self, metric, view):
+        return self._histograms.get((metric, view))
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Текст для /metrics/ в формате Prometheus exposition 0.0.4."""
+        lines = []
+        with self._lock:
+            for metric in METRICS:
+                lines.append(f'# HELP {metric.name} {metric.help}')
+                lines.append(f'# TYPE {metric.name} histogram')
+                views = sorted(
+                    view for key, view in self._histograms
+                    if key is metric
+                )
+                for view in views:
+                    histogram = self._histograms[metric, view]
+                    label = f'view="{_escape(view)}"'
+                    for bound, total in histogram.cumulative():
+                        lines.append(
+                            f'{metric.name}_bucket{{{label},le="{bound}"}} '
+                            f'{total}'
+                        )
+                    lines.append(
+                        f'{metric.name}_sum{{{label}}} {histogram.sum}')
+                    lines.append(
+                        f'{metric.name}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"')
+
+
+registry = Registry()
+
+_local = threading.local()
+
+
+class RequestStats:
+    """Счётчики одного запроса, которые пополняют обёртки БД и шаблонов."""
+
+    def __init__(self, collect_sql=False):
+        self.db_queries = 0
+        self.db_time = 0
+        self.template_time = 0
+        self.rendering = False
+        self.collect_sql = collect_sql
+        self.sql = []
+
+
+def start_request(collect_sql=False):
+    _local.stats = RequestStats(collect_sql)
+    return _local.stats
+
+
+def finish_request():
+    _local.stats = None
+
+
+def current_stats():
+    """Счётчики запроса, обрабатываемого в этом потоке, или None."""
+    return getattr(_local, 'stats', None)
+
+
+def render_cache_stats():
+    """Попадания и промахи по уровням кэшей, которые их считают."""
+    name = 'yatube_cache_requests_total'
+    lines = [
+        f'# HELP {name} Обращения к уровням кэша',
+        f'# TYPE {name} counter',
+    ]
+    sizes = [
+        '# HELP yatube_cache_local_bytes Размер локального уровня кэша',
+        '# TYPE yatube_cache_local_bytes gauge',
+    ]
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if not hasattr(backend, 'stats'):
+            continue
+        stats = backend.stats()
+        for tier in ('local', 'shared'):
+            for result, field in (('hit', 'hits'), ('miss', 'misses')):
+                lines.append(
+                    f'{name}{{cache="{alias}",tier="{tier}",'
+                    f'result="{result}"}} {stats[f"{tier}_{field}"]}'
+                )
+        sizes.append(
+            f'yatube_cache_local_bytes{{cache="{alias}"}} '
+            f'{stats["local_bytes"]}'
+        )
+    return '\n'.join(lines + sizes) + '\n'
@@ -0,0 +1,125 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+
+logger = logging.getLogger('core.slow_requests')
+
+UNRESOLVED = '<unresolved>'
+MAX_LOGGED_QUERIES = 100
+
+
+class MetricsMiddleware:
+    """Собирает метрики каждого запроса для /metrics/.
+
+    Время ответа, число и время SQL-запросов, время шаблонов и размер
+    ответа попадают в гистограммы по имени view (posts:index и т. п.).
+    Для доли METRICS_SLOW_SAMPLE_RATE запросов дополнительно
+    запоминается SQL: если такой запрос дольше METRICS_SLOW_REQUEST_MS,
+    он пишется в лог core.slow_requests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < settings.METRICS_SLOW_SAMPLE_RATE
+        stats = metrics.start_request(collect_sql=sampled)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(QueryTimer(stats)))
+                response = self.get_response(request)
+        finally:
+            metrics.finish_request()
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED
+        observe = metrics.registry.observe
+        observe(metrics.REQUEST_DURATION, view, duration)
+        observe(metrics.DB_QUERIES, view, stats.db_queries)
+        observe(metrics.DB_DURATION, view, stats.db_time)
+        observe(metrics.TEMPLATE_DURATION, view, stats.template_time)
+        if not response.streaming:
+            observe(metrics.RESPONSE_SIZE, view, len(response.content))
+
+        if sampled and duration * 1000 >= settings.METRICS_SLOW_REQUEST_MS:
+            self.log_slow_request(request, view, duration, stats)
+        return response
+
+    def log_slow_request(self, request, view, duration, stats):
+        queries = '\n'.join(
+            f'  {elapsed * 1000:.1f} ms  {sql}'
+            for sql, elapsed in stats.sql
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.0f ms, SQL %d шт. за %.0f ms, '
+            'шаблоны %.0f ms\n%s',
+            request.method, request.get_full_path(), view, duration * 1000,
+            stats.db_queries, stats.db_time * 1000,
+            stats.template_time * 1000, queries,
+        )
+
+
+class QueryTimer:
+    """Обёртка connection.execute_wrapper, считающая SQL-запросы."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats.db_queries += 1
+            self.stats.db_time += elapsed
+            if (self.stats.collect_sql
+                    and len(self.stats.sql) < MAX_LOGGED_QUERIES):
+                self.stats.sql.append((sql, elapsed))
+
+
+class ReplicaMiddleware:
+    """Отправляет чтения view из REPLICA_VIEWS на случайную реплику.
+
+    Запрос, который что-то записал, ставит cookie
+    REPLICA_STICKY_COOKIE на REPLICA_STICKY_SECONDS: пока она жива,
+    все запросы этого клиента читают из основной базы и видят свои
+    изменения, даже если реплика ещё не догнала.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.read_from(None)
+        try:
+            response = self.get_response(request)
+            if routers.wrote():
+                response.set_cookie(
+                    settings.REPLICA_STICKY_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax',
+                )
+        finally:
+            routers.read_from(None)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in self.SAFE_METHODS
+                and request.resolver_match.view_name
+                in settings.REPLICA_VIEWS
+                and settings.REPLICA_STICKY_COOKIE not in request.COOKIES):
+            routers.read_from(random.choice(settings.DATABASE_REPLICAS))
@@ -1,4 +1,8 @@
+from contextlib import contextmanager
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -10,3 +14,74 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+@contextmanager
+def explicit_pub_date(*models):
+    """Отключает auto_now_add у pub_date на время блока.
+
+    Нужно массовым загрузкам: иначе bulk_create заменит переданные
+    даты текущим временем. Меняет поле глобально, поэтому годится
+    только для management-команд.
+    """
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _default_max_attempts():
+    return settings.TASK_MAX_ATTEMPTS
+
+
+class Task(models.Model):
+    """Отложенная задача для run_worker, см. core.tasks.
+
+    Выполненные задачи удаляются, в таблице остаются ожидающие,
+    выполняющиеся и исчерпавшие попытки.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Функция', max_length=200)
+    arguments = models.TextField(
+        'Аргументы',
+        help_text='JSON вида {"args": [...], "kwargs": {...}}'
+    )
+    priority = models.IntegerField('Приоритет', default=0)
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    run_at = models.DateTimeField('Выполнить после', default=timezone.now)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField(
+        'Максимум попыток', default=_default_max_attempts
+    )
+    locked_by = models.CharField('Воркер', max_length=200, blank=True)
+    locked_at = models.DateTimeField('Взята', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'задача'
+        verbose_name_plural = 'задачи'
+        # Воркер выбирает следующую задачу по этому индексу.
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='task_queue_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
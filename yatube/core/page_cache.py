@@ -0,0 +1,105 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+
+from .cache import (get_generation, get_surrogate_versions,
+                    replica_is_current, reset_stale_served, stale_served)
+
+PAGE_KEY_PREFIX = 'page:'
+
+
+def add_surrogate_keys(request, *keys):
+    """Помечает ответ суррогатными ключами показанных на нём объектов."""
+    request.__dict__.setdefault('surrogate_keys', set()).update(
+        key for key in keys if key
+    )
+
+
+def defer_surrogate_keys(request, keys):
+    """Как add_surrogate_keys, но ключи считает функция keys.
+
+    Её вызывают, только если страница действительно ляжет в кэш:
+    ключи списка постов требуют самих постов, а при попадании во
+    фрагментный кэш шаблон их из базы не читает.
+    """
+    request.__dict__.setdefault('surrogate_key_sources', []).append(keys)
+
+
+def _surrogate_keys(request):
+    keys = set(getattr(request, 'surrogate_keys', ()))
+    for source in getattr(request, 'surrogate_key_sources', ()):
+        keys.update(key for key in source() if key)
+    return keys
+
+
+def _page_cache_key(request):
+    path = request.get_full_path().encode()
+    return PAGE_KEY_PREFIX + hashlib.md5(path).hexdigest()
+
+
+def _set_shared_headers(response, surrogate_keys):
+    response['Surrogate-Key'] = ' '.join(sorted(surrogate_keys))
+    # Браузер каждый раз сверяет ETag, а прокси держит страницу до
+    # PAGE_CACHE_TIMEOUT или до purge по Surrogate-Key.
+    patch_cache_control(
+        response, public=True, max_age=0,
+        s_maxage=settings.PAGE_CACHE_TIMEOUT,
+    )
+
+
+def cache_anonymous_page(view):
+    """Кэширует страницу целиком для анонимных пользователей.
+
+    View перечисляет показанные объекты через add_surrogate_keys
+    или defer_surrogate_keys,
+    запись кэша хранит версии этих ключей и считается свежей, пока
+    ни один из них не сбросили purge_surrogate_keys. Ключи уходят
+    в заголовок Surrogate-Key, чтобы тот же кэш мог держать прокси.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+
+        cache_key = _page_cache_key(request)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            versions, content_type, content = entry
+            if get_surrogate_versions(versions) == versions:
+                response = HttpResponse(content, content_type=content_type)
+                _set_shared_headers(response, versions)
+                return response
+
+        generation = get_generation()
+        current = replica_is_current()
+        reset_stale_served()
+        response = view(request, *args, **kwargs)
+        cacheable = (
+            current
+            and not stale_served()
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
+        if not cacheable:
+            return response
+        surrogate_keys = _surrogate_keys(request)
+        if not surrogate_keys:
+            return response
+        versions = get_surrogate_versions(surrogate_keys)
+        # Контент менялся, пока страница собиралась: версии уже новые,
+        # а HTML может быть старым.
+        if get_generation() == generation:
+            cache.set(
+                cache_key,
+                (versions, response['Content-Type'], response.content),
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+        _set_shared_headers(response, surrogate_keys)
+        return response
+    return wrapper
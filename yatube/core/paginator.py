@@ -0,0 +1,228 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core import paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class Paginator(paginator.Paginator):
+    """Paginator, который считает строки без аннотаций ленты.
+
+    Аннотации вроде числа комментариев нужны только на странице,
+    в COUNT(*) они превращаются в подзапрос на каждую строку.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, *args, count=None, **kwargs):
+        super().__init__(object_list, per_page, *args, **kwargs)
+        if count is not None:
+            # Готовое значение, например из денормализованных счётчиков.
+            self.__dict__['count'] = count
+
+    @cached_property
+    def count(self):
+        object_list = self.object_list
+        if isinstance(object_list, QuerySet) and object_list.query.annotations:
+            return object_list.values('pk').count()
+        return super().count
+
+    def get_elided_page_range(self, number=1, *, on_each_side=3, on_ends=2):
+        """Номера страниц вокруг текущей и по краям, пропуски - ELLIPSIS.
+
+        Повторяет метод из Django 3.2: при тысячах страниц паджинатор
+        не выводит ссылку на каждую.
+        """
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+class CursorPage:
+    """Страница курсорной (keyset) паджинации.
+
+    Повторяет интерфейс django.core.paginator.Page, который нужен
+    шаблонам, но вместо номеров страниц хранит непрозрачные курсоры
+    на соседние страницы.
+    """
+    cursor_based = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-паджинатор.
+
+    Вместо OFFSET и COUNT(*) каждая страница выбирается условием
+    «строго после/до ключа последней записи» по полям ordering,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Последнее поле ordering должно быть уникальным (обычно id).
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+        self.descending = self.ordering[0].startswith('-')
+
+    @cached_property
+    def count(self):
+        """Общее число строк; считается, только если его запросили."""
+        return Paginator(self.object_list, self.per_page).count
+
+    def encode_cursor(self, obj, direction):
+        model_fields = self.object_list.model._meta
+        values = [
+            model_fields.get_field(name).value_to_string(obj)
+            for name in self.fields
+        ]
+        data = json.dumps({'d': direction, 'v': values},
+                          separators=(',', ':'))
+        return base64.urlsafe_b64encode(
+            data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (direction, values) или None для битого курсора."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction, raw_values = data['d'], data['v']
+            if direction not in (NEXT, PREVIOUS):
+                return None
+            if len(raw_values) != len(self.fields):
+                return None
+            model_fields = self.object_list.model._meta
+            values = [
+                model_fields.get_field(name).to_python(value)
+                for name, value in zip(self.fields, raw_values)
+            ]
+        except (ValueError, TypeError, KeyError, binascii.Error,
+                ValidationError):
+            return None
+        return direction, values
+
+    def _keyset_filter(self, values, forward):
+        """Строит Q для строк после (forward) или до ключа values."""
+        after = forward == self.descending
+        lookup = 'lt' if after else 'gt'
+        condition = Q()
+        for position, name in enumerate(self.fields):
+            equal = {
+                self.fields[i]: values[i] for i in range(position)
+            }
+            bound = {f'{name}__{lookup}': values[position]}
+            condition |= Q(**equal, **bound)
+        return condition
+
+    def _reversed_ordering(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу по курсору.
+
+        Пустой или некорректный курсор означает первую страницу,
+        по аналогии с Paginator.get_page.
+        """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        limit = self.per_page + 1
+        if decoded is None:
+            rows = list(self.object_list.order_by(*self.ordering)[:limit])
+            has_next = len(rows) > self.per_page
+            has_previous = False
+            rows = rows[:self.per_page]
+        elif decoded[0] == NEXT:
+            rows = list(
+                self.object_list.filter(
+                    self._keyset_filter(decoded[1], forward=True)
+                ).order_by(*self.ordering)[:limit]
+            )
+            has_next = len(rows) > self.per_page
+            has_previous = True
+            rows = rows[:self.per_page]
+        else:
+            rows = list(
+                self.object_list.filter(
+                    self._keyset_filter(decoded[1], forward=False)
+                ).order_by(*self._reversed_ordering())[:limit]
+            )
+            has_previous = len(rows) > self.per_page
+            has_next = True
+            rows = rows[:self.per_page][::-1]
+        if not rows:
+            return CursorPage(rows, self)
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=(
+                self.encode_cursor(rows[-1], NEXT) if has_next else None),
+            previous_cursor=(
+                self.encode_cursor(rows[0], PREVIOUS)
+                if has_previous else None),
+        )
+
+
+def paginate(request, queryset, per_page=None, count=None,
+             cursor_paginator=CursorPaginator):
+    """Паджинация списка для view.
+
+    Курсорный режим включается параметром ?cursor= в запросе
+    или настройкой PAGINATION_MODE = 'cursor', иначе используется
+    обычный постраничный Paginator. Известное заранее число строк
+    передаётся в count, чтобы не выполнять COUNT(*). Списку, который
+    не QuerySet, нужен свой cursor_paginator.
+    """
+    per_page = per_page or settings.POSTS_PER_PAGE
+    cursor = request.GET.get('cursor')
+    if cursor is not None or settings.PAGINATION_MODE == 'cursor':
+        return cursor_paginator(queryset, per_page).get_page(cursor)
+    paginator = Paginator(queryset, per_page, count=count)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,49 @@
+"""Маршрутизация запросов между основной базой и репликами.
+
+Пишет приложение всегда в default. Читать с реплики разрешает
+ReplicaMiddleware - только в view из REPLICA_VIEWS и только тем,
+кто недавно ничего не менял: реплика отстаёт, и свой пост автор
+должен увидеть сразу.
+"""
+import threading
+
+DEFAULT_DB_ALIAS = 'default'
+
+_local = threading.local()
+
+
+def read_from(alias):
+    """Направляет чтения текущего потока в alias (None - в default)."""
+    _local.read_alias = alias
+    _local.wrote = False
+
+
+def current_replica():
+    """Реплика, выбранная для текущего потока, или None."""
+    return getattr(_local, 'read_alias', None)
+
+
+def wrote():
+    """Писал ли текущий поток в базу после read_from()."""
+    return getattr(_local, 'wrote', False)
+
+
+class PrimaryReplicaRouter:
+    """Чтения - в реплику, выбранную для запроса, запись - в default.
+
+    После первой записи запрос дочитывает из default, чтобы не
+    разминуться с только что записанным.
+    """
+
+    def db_for_read(self, model, **hints):
+        if wrote():
+            return DEFAULT_DB_ALIAS
+        return getattr(_local, 'read_alias', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default, объекты из них можно связывать.
+        return True
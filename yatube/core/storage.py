@@ -0,0 +1,47 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл под именем из SHA-256 его содержимого.
+
+    Файл из upload_to='posts/' ложится в posts/ab/<sha256>.jpg.
+    Одинаковое содержимое получает одно имя, поэтому повторная
+    загрузка ничего не пишет и возвращает имя уже лежащего файла.
+    Удалять такой файл можно только когда на него никто не ссылается.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежий mtime: сборка мусора не трогает молодые файлы,
+            # а пост с этой картинкой, возможно, ещё не сохранён.
+            os.utime(self.path(name))
+            return name
+        # Два одновременных первых сохранения одного содержимого
+        # дадут копию с суффиксом: лишний файл, но не потеря.
+        return super().save(name, content, max_length)
+
+    def hashed_name(self, name, content):
+        """Имя файла по хэшу содержимого, посчитанному по частям."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks(self.CHUNK_SIZE):
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+
+blob_storage = ContentAddressedStorage()
@@ -0,0 +1,187 @@
+"""Очередь задач в базе данных.
+
+enqueue() записывает вызов функции в core.Task, команда run_worker
+выполняет задачи в порядке приоритета. Задача пишется в той же
+транзакции, что и данные, к которым она относится, поэтому воркер
+не увидит её раньше коммита, а откат запроса отменит и её.
+"""
+import json
+import logging
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .db import retry_on_locked
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+# Сколько раз подряд пробовать взять задачу, если её перехватил
+# другой воркер.
+CLAIM_ATTEMPTS = 5
+
+
+class LockLost(Exception):
+    """Задачу, пока она выполнялась, вернули в очередь."""
+
+
+def enqueue(func, *args, priority=PRIORITY_NORMAL, delay=0,
+            max_attempts=None, **kwargs):
+    """Ставит вызов func(*args, **kwargs) в очередь.
+
+    func - функция уровня модуля или её путь для import_string,
+    аргументы должны сериализоваться в JSON. delay откладывает
+    выполнение на столько секунд.
+    """
+    if not isinstance(func, str):
+        func = f'{func.__module__}.{func.__qualname__}'
+    task = Task(
+        name=func,
+        arguments=json.dumps({'args': args, 'kwargs': kwargs}),
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if max_attempts is not None:
+        task.max_attempts = max_attempts
+    task.save()
+    return task
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед следующей попыткой с разбросом,
+    чтобы задачи, упавшие вместе, не повторялись тоже вместе."""
+    delay = settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)
+    return delay * random.uniform(1, 1.2)
+
+
+@retry_on_locked
+def claim(worker):
+    """Берёт следующую готовую задачу или возвращает None.
+
+    Задача переводится в running условным UPDATE: из нескольких
+    воркеров, выбравших одну строку, её получает только один.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        now = timezone.now()
+        task = Task.objects.filter(
+            status=Task.PENDING, run_at__lte=now
+        ).order_by('-priority', 'run_at', 'pk').first()
+        if task is None:
+            return None
+        taken = Task.objects.filter(
+            pk=task.pk, status=Task.PENDING
+        ).update(
+            status=Task.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if taken:
+            task.refresh_from_db()
+            return task
+    return None
+
+
+def _release(task, error):
+    """Поля неудачной попытки: повтор с задержкой или failed, если
+    попытки кончились."""
+    fields = {'locked_by': '', 'locked_at': None, 'last_error': error}
+    if task.attempts >= task.max_attempts:
+        fields['status'] = Task.FAILED
+    else:
+        fields['status'] = Task.PENDING
+        fields['run_at'] = timezone.now() + timedelta(
+            seconds=retry_delay(task.attempts))
+    return fields
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи воркеров, которые не закончили их
+    за TASK_LOCK_TIMEOUT (например, были убиты).
+
+    Такая попытка считается неудачной: задача, которая каждый раз
+    роняет воркер, после max_attempts попыток становится failed.
+    """
+    deadline = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    stale = Task.objects.filter(
+        status=Task.RUNNING, locked_at__lt=deadline
+    ).only('pk', 'attempts', 'max_attempts', 'locked_at')
+    released = 0
+    for task in stale:
+        # Пока шёл обход, задачу мог вернуть в очередь другой воркер.
+        released += Task.objects.filter(
+            pk=task.pk, status=Task.RUNNING, locked_at=task.locked_at
+        ).update(**_release(
+            task, 'Воркер не завершил задачу за TASK_LOCK_TIMEOUT'))
+    return released
+
+
+def _owned(task):
+    """Строка задачи, если её всё ещё держит взявший её воркер."""
+    return Task.objects.filter(
+        pk=task.pk, status=Task.RUNNING,
+        locked_by=task.locked_by, locked_at=task.locked_at,
+    )
+
+
+def run_task(task):
+    """Выполняет задачу; возвращает True, если она завершилась успешно.
+
+    Задача выполняется в транзакции: упавшая попытка ничего не
+    оставляет в базе, и повтор начинает с чистого листа. Если
+    задачу, пока она шла дольше TASK_LOCK_TIMEOUT, вернули в очередь
+    и взял другой воркер, её результат откатывается, а строку
+    задачи этот воркер больше не трогает.
+    """
+    try:
+        func = import_string(task.name)
+        arguments = json.loads(task.arguments)
+        with transaction.atomic():
+            func(*arguments['args'], **arguments['kwargs'])
+            deleted, _ = _owned(task).delete()
+            if not deleted:
+                raise LockLost
+    except LockLost:
+        logger.warning('Задачу %s (%s) вернули в очередь до завершения',
+                       task.pk, task.name)
+        return False
+    except Exception as error:
+        logger.exception('Задача %s (%s) завершилась ошибкой',
+                         task.pk, task.name)
+        _owned(task).update(
+            **_release(task, f'{type(error).__name__}: {error}'))
+        return False
+    return True
+
+
+def work(worker, stop, once=False):
+    """Цикл воркера: выполняет задачи, пока не выставлен stop.
+
+    Когда очередь пуста, ждёт TASK_POLL_INTERVAL секунд, а с once
+    завершается. Возвращает число выполненных задач.
+    """
+    done = 0
+    while not stop.is_set():
+        task = claim(worker)
+        if task is None:
+            requeue_stale()
+            if once:
+                break
+            stop.wait(settings.TASK_POLL_INTERVAL)
+            continue
+        started = time.monotonic()
+        if run_task(task):
+            done += 1
+            logger.info('Задача %s (%s) выполнена за %.3f с',
+                        task.pk, task.name, time.monotonic() - started)
+    return done
@@ -0,0 +1,34 @@
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+
+class InstrumentedTemplate(Template):
+    """Шаблон, время рендеринга которого попадает в метрики запроса."""
+
+    def render(self, context=None, request=None):
+        stats = metrics.current_stats()
+        # Вложенный рендеринг уже учтён во времени внешнего шаблона.
+        if stats is None or stats.rendering:
+            return super().render(context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.rendering = False
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, замеряющий рендеринг для MetricsMiddleware."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(
+            super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(
+            super().get_template(template_name).template, self)
@@ -0,0 +1,41 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+# Image.MIME Pillow заполняет, только загрузив плагины, а страница
+# с готовыми миниатюрами не открывает ни одной картинки.
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+
+def _srcset(variants):
+    return ', '.join(
+        f"{variant['url']} {variant['width']}w" for variant in variants)
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, name='card', loading='lazy'):
+    """<picture> с миниатюрой name поста во всех ширинах и форматах.
+
+    {% post_image post %}, для первой картинки страницы
+    {% post_image post loading='eager' %}. Пока миниатюр нет,
+    выводится исходная картинка.
+    """
+    thumb = post.thumbnail_urls.get(name) if post.image else None
+    variants = (thumb or {}).get('variants', {})
+    formats = [
+        format for format in settings.POST_IMAGE_VARIANT_FORMATS
+        if variants.get(format.lower())
+    ]
+    return {
+        'post': post,
+        'thumb': thumb,
+        'sources': [
+            {'type': MIME_TYPES[format],
+             'srcset': _srcset(variants[format.lower()])}
+            for format in formats[:-1]
+        ],
+        'srcset': _srcset(variants[formats[-1].lower()]) if formats else '',
+        'sizes': settings.POST_IMAGE_SIZES,
+        'loading': loading,
+    }
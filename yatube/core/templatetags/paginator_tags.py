@@ -0,0 +1,26 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def query_replace(context, **params):
+    """Строка запроса текущей страницы с заменёнными параметрами.
+
+    Сохраняет остальные GET-параметры (например, ?q= поиска)
+    в ссылках паджинатора.
+    """
+    query = context['request'].GET.copy()
+    for name, value in params.items():
+        query[name] = value
+    return query.urlencode()
+
+
+@register.simple_tag
+def elided_page_range(page_obj, on_each_side=3, on_ends=2):
+    """Сокращённый список номеров страниц для page_obj.
+
+    {% elided_page_range page_obj as pages %}
+    """
+    return list(page_obj.paginator.get_elided_page_range(
+        page_obj.number, on_each_side=on_each_side, on_ends=on_ends))
@@ -0,0 +1,79 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.template import TemplateSyntaxError, VariableDoesNotExist
+
+from core.cache import get_or_compute
+
+register = template.Library()
+
+
+class StaleCacheNode(template.Node):
+    def __init__(self, nodelist, timeout_var, fragment_name, vary_on,
+                 options):
+        self.nodelist = nodelist
+        self.timeout_var = timeout_var
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.options = options
+
+    def resolve_timeout(self, var, context):
+        try:
+            return int(var.resolve(context))
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError(
+                f'"cache" tag got an unknown variable: {var.var!r}')
+        except (ValueError, TypeError):
+            raise TemplateSyntaxError(
+                f'"cache" tag got a non-integer timeout: {var.var!r}')
+
+    def render(self, context):
+        timeout = self.resolve_timeout(self.timeout_var, context)
+        hard_timeout = None
+        if 'hard' in self.options:
+            hard_timeout = self.resolve_timeout(
+                self.options['hard'], context)
+        version = None
+        if 'version' in self.options:
+            version = str(self.options['version'].resolve(context))
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            timeout,
+            hard_timeout,
+            version,
+        )
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    """Замена стандартного {% cache %} с защитой от лавины пересчётов.
+
+    {% load stale_cache %}
+    {% cache timeout name [var ...] [hard=timeout] [version=var] %}
+        ...
+    {% endcache %}
+
+    После timeout фрагмент пересчитывает один запрос, остальные
+    отдают старый до hard (по умолчанию timeout
+    * STALE_CACHE_HARD_FACTOR). Смена version не даёт новый ключ,
+    а делает старый фрагмент устаревшим, поэтому он продолжает
+    отдаваться, пока идёт пересчёт.
+    """
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise TemplateSyntaxError(
+            f'"{bits[0]}" tag requires at least 2 arguments.')
+    options = {}
+    while bits[-1].startswith(('hard=', 'version=')):
+        name, value = bits.pop().split('=', 1)
+        options[name] = parser.compile_filter(value)
+    return StaleCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]],
+        options,
+    )
@@ -0,0 +1,45 @@
+import copy
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import connections
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+# Реплика для тестов маршрутизатора; запросы на неё идут только
+# с override_settings(DATABASE_REPLICAS=['replica']).
+REPLICA_ALIAS = 'replica'
+
+
+def isolated_caches():
+    """override_settings с общим кэшем в своём временном файле.
+
+    Файл общего кэша переживает тестовую базу, и страницы из
+    прошлого прогона попадали бы в новый.
+    """
+    caches = copy.deepcopy(settings.CACHES)
+    shared = caches['shared']
+    shared['LOCATION'] = os.path.join(
+        tempfile.gettempdir(), f'yatube-test-cache-{os.getpid()}.sqlite3')
+    shared.setdefault('OPTIONS', {})['TEMPORARY'] = True
+    return override_settings(CACHES=caches)
+
+
+class TestRunner(DiscoverRunner):
+    """Раннер manage.py test: отдельный общий кэш и тестовая реплика."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches = isolated_caches()
+        self.caches.enable()
+        # Тестовые базы создаются только для известных алиасов, а
+        # список нужных тестам баз собирается до setup_databases.
+        connections.databases.setdefault(REPLICA_ALIAS, {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(settings.BASE_DIR, 'replica.sqlite3'),
+        })
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches.disable()
+        super().teardown_test_environment(**kwargs)
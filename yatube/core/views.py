@@ -1,4 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
+
+from .metrics import registry, render_cache_stats
 
 
 def page_not_found(request, exception):
@@ -14,3 +21,23 @@ def csrf_failure(request, reason=''):
 def page_500(request):
     return render(
         request, 'core/500.html', {'path': request.path}, status=500)
+
+
+def metrics_allowed(request):
+    """Пускает по токену METRICS_TOKEN или по адресу из METRICS_ALLOWED_IPS."""
+    token = settings.METRICS_TOKEN
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+@never_cache
+def metrics(request):
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        registry.render() + render_cache_stats(),
+        content_type='text/plain; version=0.0.4',
+    )
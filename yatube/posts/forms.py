@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from .ingest import normalize_image
 from .models import Post, Comment, Follow
 
 
@@ -8,6 +11,16 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Уже сохранённую картинку (правка без новой) не трогаем.
+        if isinstance(image, UploadedFile):
+            image = normalize_image(image)
+            self.instance.placeholder = image.placeholder
+        elif not image:
+            self.instance.placeholder = ''
+        return image
+
 
 class CommentForm(forms.ModelForm):
 
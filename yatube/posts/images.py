@@ -0,0 +1,82 @@
+"""Учёт ссылок постов на файлы картинок.
+
+Файл в core.storage.blob_storage может быть общим у многих постов,
+поэтому его удаляет не пост, а сборка мусора, когда в ImageBlob
+не осталось ссылок.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import Count, F
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import blob_storage
+from .models import ImageBlob, Post
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    """Добавляет ссылку на файл name."""
+    if not name:
+        return
+    ImageBlob.objects.get_or_create(name=name)
+    ImageBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Снимает ссылку на файл name; последняя удаляет файл после
+    коммита, чтобы откат транзакции не оставил пост без картинки."""
+    if not name:
+        return
+    ImageBlob.objects.filter(name=name).update(refs=F('refs') - 1)
+    if ImageBlob.objects.filter(name=name, refs__lte=0).exists():
+        transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    """Удаляет файл name с миниатюрами, если на него нет ссылок.
+
+    Возвращает True, если файл удалён.
+    """
+    deleted, _ = ImageBlob.objects.filter(name=name, refs__lte=0).delete()
+    if not deleted:
+        # Ссылку успели добавить снова.
+        return False
+    try:
+        # Удаляет и файл, и миниатюры sorl с их записями в KV.
+        delete_thumbnails(ImageFile(name, blob_storage))
+    except SuspiciousFileOperation:
+        logger.warning('Файл %s вне MEDIA_ROOT, не удаляю', name)
+    return True
+
+
+def recount_blobs():
+    """Пересчитывает ссылки по постам; файлы без ссылок удаляются.
+
+    Нужен после массовых загрузок: bulk_create не вызывает сигналы.
+    Возвращает число исправленных строк.
+    """
+    totals = dict(
+        Post.objects.exclude(image='').order_by().values('image')
+        .annotate(refs=Count('pk')).values_list('image', 'refs')
+    )
+    fixed = 0
+    orphans = []
+    blobs = list(ImageBlob.objects.values_list('name', 'refs'))
+    for name, old_refs in blobs:
+        refs = totals.pop(name, 0)
+        if old_refs != refs:
+            ImageBlob.objects.filter(name=name).update(refs=refs)
+            fixed += 1
+        if not refs:
+            orphans.append(name)
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name, refs=refs) for name, refs in totals.items()],
+        batch_size=500,
+    )
+    for name in orphans:
+        collect(name)
+    return fixed + len(totals)
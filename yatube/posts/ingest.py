@@ -0,0 +1,102 @@
+"""Приведение загруженных картинок к виду, в котором они хранятся.
+
+Телефон присылает фото на 20 МБ с EXIF, а показывается оно
+миниатюрой: хранить и каждый раз декодировать оригинал незачем.
+"""
+import os
+from base64 import b64encode
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageFilter, ImageOps
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+# GIF может быть анимированным, а EXIF у него не бывает.
+PASSTHROUGH_FORMATS = ('GIF',)
+# Сторона заглушки: браузер растягивает её на всю картинку.
+PLACEHOLDER_SIZE = 16
+
+
+def _save_options(format, icc_profile):
+    options = {
+        'quality': settings.POST_IMAGE_QUALITY,
+        # Цветовой профиль не метаданные: без него поплывут цвета.
+        'icc_profile': icc_profile,
+    }
+    if format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=6)
+    return options
+
+
+def _convert(image, format):
+    """RGB для JPEG (прозрачное - на белом фоне), для WebP ещё RGBA."""
+    has_alpha = (image.mode in ('RGBA', 'LA', 'PA')
+                 or 'transparency' in image.info)
+    if has_alpha and format == 'WEBP':
+        return image.convert('RGBA')
+    if has_alpha:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image if image.mode == 'RGB' else image.convert('RGB')
+
+
+def make_placeholder(image):
+    """Крошечная размытая копия image как data: URI.
+
+    Показывается фоном <img>, пока грузится сама картинка.
+    """
+    image = image.copy()
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    image = _convert(image, 'JPEG').filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + b64encode(
+        buffer.getvalue()).decode()
+
+
+def normalize_image(upload):
+    """Возвращает уменьшенную и перекодированную копию upload.
+
+    Размер берётся из заголовка до декодирования, а JPEG
+    декодируется сразу в уменьшенном масштабе (Image.draft).
+    Ориентация из EXIF применяется к пикселям, сами метаданные
+    в новый файл не попадают. В атрибуте placeholder результата
+    лежит заглушка из make_placeholder.
+    """
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        image = None
+    if (image is None or image.width * image.height
+            > settings.POST_IMAGE_MAX_PIXELS):
+        raise ValidationError(
+            'Картинка слишком большая', code='image_too_large')
+    if image.format in PASSTHROUGH_FORMATS:
+        upload.placeholder = make_placeholder(image)
+        upload.seek(0)
+        return upload
+
+    format = settings.POST_IMAGE_FORMAT
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    scale = min(1, max_size / max(image.size))
+    image.draft('RGB', (round(image.width * scale),
+                        round(image.height * scale)))
+    icc_profile = image.info.get('icc_profile')
+    image = _convert(ImageOps.exif_transpose(image), format)
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format, **_save_options(format, icc_profile))
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    result = SimpleUploadedFile(
+        name + EXTENSIONS[format], buffer.getvalue(),
+        content_type=Image.MIME[format],
+    )
+    result.placeholder = make_placeholder(image)
+    return result
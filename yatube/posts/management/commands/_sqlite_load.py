@@ -0,0 +1,93 @@
+"""Нагрузка на SQLite для команды bench_db.
+
+Модуль выполняется в отдельных процессах, запущенных через spawn:
+форк тестового или боевого процесса с живыми потоками может
+унести в потомка чужую захваченную блокировку. Поэтому здесь нет
+ни моделей, ни настроек Django - всё нужное приходит аргументами.
+"""
+import random
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from core.db import is_locked
+
+
+def connect(path, pragmas):
+    db = sqlite3.connect(path, isolation_level=None)
+    for name, value in pragmas.items():
+        db.execute(f'PRAGMA {name} = {value}')
+    return db
+
+
+def _write(db, table, post_id, author_id):
+    # Как view: транзакция сначала читает, потом пишет.
+    db.execute('BEGIN')
+    try:
+        db.execute(
+            f'SELECT COUNT(*) FROM {table} WHERE post_id = ?', (post_id,)
+        ).fetchone()
+        db.execute(
+            f'INSERT INTO {table} '
+            f'(post_id, author_id, text, pub_date) VALUES (?, ?, ?, ?)',
+            (post_id, author_id, 'bench',
+             datetime.now(timezone.utc).replace(tzinfo=None).isoformat(' ')),
+        )
+        db.execute('COMMIT')
+    except sqlite3.OperationalError:
+        db.execute('ROLLBACK')
+        raise
+
+
+def _write_with_retry(db, table, post_id, author_id, retry, result):
+    """Запись с повторами по правилам core.db.retry_on_locked."""
+    retries, delay = retry
+    for attempt in range(retries):
+        try:
+            return _write(db, table, post_id, author_id)
+        except sqlite3.OperationalError as error:
+            if not is_locked(error):
+                raise
+            result['retries'] += 1
+            time.sleep(delay * 2 ** attempt * random.uniform(1, 1.5))
+    return _write(db, table, post_id, author_id)
+
+
+def worker(path, pragmas, reconnect, seconds, write_ratio, read, write,
+           seed):
+    """Нагрузка одного процесса; возвращает счётчики и задержки.
+
+    read - SQL и параметры страницы ленты без смещения, write -
+    таблица комментариев, id постов и авторов и (повторы, задержка).
+    """
+    table, post_ids, author_ids, retry = write
+    rng = random.Random(seed)
+    result = {
+        'reads': 0, 'writes': 0, 'retries': 0, 'errors': 0, 'timings': [],
+    }
+    db = None if reconnect else connect(path, pragmas)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        if reconnect:
+            db = connect(path, pragmas)
+        try:
+            if rng.random() < write_ratio:
+                _write_with_retry(
+                    db, table, rng.choice(post_ids), rng.choice(author_ids),
+                    retry, result,
+                )
+                result['writes'] += 1
+            else:
+                sql, params = read
+                db.execute(sql, (*params, rng.randrange(10) * 10)).fetchall()
+                result['reads'] += 1
+        except sqlite3.OperationalError:
+            result['errors'] += 1
+        finally:
+            if reconnect:
+                db.close()
+        result['timings'].append((time.perf_counter() - started) * 1000)
+    if not reconnect:
+        db.close()
+    return result
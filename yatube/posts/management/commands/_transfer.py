@@ -0,0 +1,55 @@
+"""Формат записей import_posts и export_posts.
+
+Одна запись - один пост или комментарий. Посты идут раньше
+комментариев к ним; комментарий ссылается на пост по id.
+"""
+import csv
+import json
+
+from django.core.management.base import CommandError
+
+FIELDS = ('type', 'id', 'post', 'author', 'group', 'text', 'pub_date',
+          'image')
+FORMATS = ('ndjson', 'csv')
+POST = 'post'
+COMMENT = 'comment'
+
+
+def detect_format(path, format=None):
+    """Формат из аргумента или из расширения файла."""
+    if format:
+        return format
+    if path and path.endswith('.csv'):
+        return 'csv'
+    if path in (None, '-') or path.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise CommandError(f'Не удалось определить формат {path}, '
+                       f'укажите --format')
+
+
+def read_records(file, format):
+    """Записи файла по одной, без чтения файла целиком."""
+    if format == 'csv':
+        for row in csv.DictReader(file):
+            yield {key: value for key, value in row.items() if value != ''}
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+class RecordWriter:
+    """Пишет записи в file в формате format."""
+
+    def __init__(self, file, format):
+        self.file = file
+        self.format = format
+        if format == 'csv':
+            self.csv = csv.DictWriter(file, FIELDS, lineterminator='\n')
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.format == 'csv':
+            self.csv.writerow(record)
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
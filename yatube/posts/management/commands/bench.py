@@ -0,0 +1,138 @@
+import json
+import math
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from posts import urls
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+BENCH_ADDR = '192.0.2.1'
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(rank / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет каждый URL из posts.urls через тестовый клиент '
+        'и печатает JSON с перцентилями задержки, числом запросов '
+        'к базе и размером ответа'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько замеров делать для каждого URL',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Сколько запросов выполнить до замеров',
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Не входить на сайт: закрытые страницы дадут редирект',
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('Нужен хотя бы один замер')
+        follow = Follow.objects.order_by('pk').first()
+        reader = follow.user if follow else User.objects.first()
+        if reader is None or not Post.objects.exists():
+            raise CommandError('В базе нет данных, запустите seed_bench')
+        # Адрес вне INTERNAL_IPS, чтобы debug toolbar не искажал замеры.
+        client = Client(HTTP_HOST='127.0.0.1', REMOTE_ADDR=BENCH_ADDR)
+        if not options['anonymous']:
+            client.force_login(reader)
+
+        report = {
+            'posts': Post.objects.count(),
+            'users': User.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+            'urls': {},
+        }
+        # Подписка, отписка и прочие изменения откатываются.
+        try:
+            with transaction.atomic():
+                for name, url in self.build_urls(reader):
+                    report['urls'][name] = self.measure(
+                        client, url, options['requests'], options['warmup']
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
+
+    def build_urls(self, reader):
+        """URL для каждого маршрута posts.urls на реальных объектах."""
+        post = (
+            Post.objects.filter(author=reader).order_by('-pk').first()
+            or Post.objects.order_by('-pk').first()
+        )
+        follow = Follow.objects.filter(user=reader).first()
+        group = Group.objects.filter(posts__isnull=False).first()
+        values = {
+            'post_id': post.pk,
+            'username': follow.author.username if follow
+            else post.author.username,
+            'slug': group.slug if group else None,
+        }
+        words = [word for word in post.text.split() if len(word) > 3]
+        word = words[0] if words else 'пост'
+        queries = {'search': '?' + urlencode({'q': word})}
+        built = []
+        for pattern in urls.urlpatterns:
+            kwargs = {
+                key: values[key] for key in pattern.pattern.converters
+            }
+            if None in kwargs.values():
+                continue
+            url = reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs)
+            built.append((pattern.name, url + queries.get(pattern.name, '')))
+        return built
+
+    def measure(self, client, url, requests, warmup):
+        for _ in range(warmup):
+            client.get(url)
+        timings = []
+        queries = []
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+        result = {
+            'url': url,
+            'status': response.status_code,
+            'bytes': len(response.content),
+            'queries': max(queries),
+        }
+        for rank in PERCENTILES:
+            result[f'p{rank}_ms'] = round(percentile(timings, rank), 3)
+        return result
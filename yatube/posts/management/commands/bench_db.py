@@ -0,0 +1,124 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.models import Comment, Post
+from ._sqlite_load import connect, worker
+from .bench import PERCENTILES, percentile
+
+# Профиль по умолчанию повторяет прежнюю настройку: соединение
+# на каждый запрос (CONN_MAX_AGE = 0), журнал DELETE и таймаут
+# модуля sqlite3 в 5 секунд.
+DEFAULT_PRAGMAS = {'journal_mode': 'delete', 'busy_timeout': 5000}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite под параллельной '
+        'нагрузкой из нескольких процессов: прежняя настройка против '
+        'SQLITE_PRAGMAS с постоянным соединением. Работает на копии базы '
+        'и печатает JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=4,
+            help='Сколько процессов нагружают базу одновременно',
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Сколько секунд длится прогон каждого профиля',
+        )
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='Доля операций записи',
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер имеет смысл только для SQLite')
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+        author_ids = list(
+            Post.objects.values_list('author_id', flat=True)[:1000])
+        if not post_ids:
+            raise CommandError('В базе нет данных, запустите seed_bench')
+        read_sql, read_params = (
+            Post.objects.for_listing().order_by('-pub_date', '-id')
+            .query.get_compiler(connection=connection).as_sql()
+        )
+        # Страница ленты со случайным смещением вместо фиксированного.
+        read_sql += ' LIMIT 10 OFFSET %s'
+        read = (read_sql.replace('%s', '?'), tuple(read_params))
+        write = (
+            Comment._meta.db_table, post_ids, author_ids,
+            (settings.DB_LOCKED_RETRIES, settings.DB_LOCKED_RETRY_DELAY),
+        )
+
+        profiles = {
+            'default': (DEFAULT_PRAGMAS, True),
+            'tuned': (settings.SQLITE_PRAGMAS, False),
+        }
+        report = {
+            'processes': options['processes'],
+            'seconds': options['seconds'],
+            'write_ratio': options['write_ratio'],
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for name, (pragmas, reconnect) in profiles.items():
+                path = os.path.join(directory, f'{name}.sqlite3')
+                self.copy_database(path)
+                report[name] = self.run(
+                    path, pragmas, reconnect, options, read, write)
+        report['speedup'] = round(
+            report['tuned']['ops_per_second']
+            / max(report['default']['ops_per_second'], 1e-9), 2
+        )
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
+
+    def copy_database(self, path):
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            connection.connection.backup(target)
+        finally:
+            target.close()
+
+    def run(self, path, pragmas, reconnect, options, read, write):
+        # Режим журнала хранится в файле базы, его выставляем заранее.
+        connect(path, pragmas).close()
+        arguments = [
+            (path, pragmas, reconnect, options['seconds'],
+             options['write_ratio'], read, write, seed)
+            for seed in range(options['processes'])
+        ]
+        # Не fork: потоки этого процесса могли держать блокировки.
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(options['processes']) as pool:
+            results = pool.starmap(worker, arguments)
+        timings = [
+            value for result in results for value in result['timings']
+        ]
+        totals = {
+            key: sum(result[key] for result in results)
+            for key in ('reads', 'writes', 'retries', 'errors')
+        }
+        summary = {
+            'ops_per_second': round(
+                (totals['reads'] + totals['writes']) / options['seconds'], 1),
+            **totals,
+        }
+        for rank in PERCENTILES:
+            summary[f'p{rank}_ms'] = round(percentile(timings, rank), 3)
+        return summary
@@ -0,0 +1,147 @@
+import re
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from posts import urls
+from posts.models import Follow, Post
+
+# «SCAN posts_post» (или «SCAN TABLE posts_post» в SQLite до 3.36)
+# без USING INDEX означает полный проход по таблице.
+FULL_SCAN = re.compile(
+    r'^SCAN (?:TABLE )?(?P<table>\w+)(?: AS \w+)?$'
+)
+# Сортировка во временном B-дереве: чтобы отдать страницу, SQLite
+# читает и сортирует все подходящие строки, а не первые из индекса.
+TEMP_SORT = re.compile(r'^USE TEMP B-TREE FOR (?:[\w ]+ )?ORDER BY$')
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+# Формы создания и редактирования поста перечисляют все группы.
+ALLOWED_TABLES = ('posts_group',)
+# Поиск сортирует только посты, найденные по постингам: обход постов
+# по дате вместо этого прочитал бы всю таблицу ради редкого слова.
+ALLOWED_SORTS = ('posts:search',)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN QUERY PLAN для запросов каждого view '
+        'из posts.urls и падает, если есть полный проход по таблице '
+        'или страница списка сортируется во временном B-дереве'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--allow-table', action='append', default=[],
+            help='Таблица, полный проход по которой допустим',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда рассчитана на SQLite')
+        post = (
+            Post.objects.filter(group__isnull=False).first()
+            or Post.objects.first()
+        )
+        if post is None:
+            raise CommandError('В базе нет постов для проверки')
+        follow = Follow.objects.filter(author=post.author).first()
+        reader = follow.user if follow else post.author
+        allowed = set(ALLOWED_TABLES) | set(options['allow_table'])
+        self.verbosity = options['verbosity']
+
+        requests = self.build_requests(post, reader)
+        missing = {
+            f'{urls.app_name}:{pattern.name}' for pattern in urls.urlpatterns
+        }.difference(name for name, _ in requests)
+        if missing:
+            raise CommandError(
+                'Не проверяются view: ' + ', '.join(sorted(missing)))
+        failures = []
+        try:
+            with transaction.atomic():
+                for name, request in requests:
+                    failures += self.check_view(name, request, allowed)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            for name, problem, sql in failures:
+                self.stderr.write(f'{name}: {problem}\n{sql}')
+            raise CommandError(
+                f'Найдено запросов без подходящего индекса: {len(failures)}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Все запросы используют индексы'
+        ))
+
+    def build_requests(self, post, reader):
+        factory = RequestFactory()
+        author = post.author.username
+        urls = [
+            ('posts:index', {}, None),
+            ('posts:group_list', {'slug': post.group.slug}, None)
+            if post.group else None,
+            ('posts:profile', {'username': author}, None),
+            ('posts:post_detail', {'post_id': post.pk}, None),
+            ('posts:post_comments', {'post_id': post.pk}, None),
+            ('posts:post_create', {}, post.author),
+            ('posts:post_edit', {'post_id': post.pk}, post.author),
+            ('posts:follow_index', {}, reader),
+            ('posts:profile_follow', {'username': author}, reader),
+            ('posts:profile_unfollow', {'username': author}, reader),
+        ]
+        requests = []
+        for name, kwargs, user in filter(None, urls):
+            request = factory.get(reverse(name, kwargs=kwargs))
+            request.user = user or AnonymousUser()
+            requests.append((name, request))
+        request = factory.get(
+            reverse('posts:search'), {'q': post.text.split()[0]})
+        request.user = AnonymousUser()
+        requests.append(('posts:search', request))
+        request = factory.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'EXPLAIN'},
+        )
+        request.user = reader
+        requests.append(('posts:add_comment', request))
+        return requests
+
+    def check_view(self, name, request, allowed):
+        match = resolve(request.path)
+        with CaptureQueriesContext(connection) as queries:
+            match.func(request, *match.args, **match.kwargs)
+        failures = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith(EXPLAINED):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+                for step in plan:
+                    found = FULL_SCAN.match(step)
+                    if found and found.group('table') not in allowed:
+                        failures.append((
+                            name,
+                            f'полный проход по {found.group("table")}',
+                            sql,
+                        ))
+                    elif (TEMP_SORT.match(step) and ' LIMIT ' in sql
+                          and name not in ALLOWED_SORTS):
+                        failures.append((
+                            name, 'сортировка страницы без индекса', sql))
+                if self.verbosity > 1:
+                    self.stdout.write(f'{name}: {sql}')
+                    for step in plan:
+                        self.stdout.write(f'    {step}')
+        return failures
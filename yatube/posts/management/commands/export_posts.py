@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Post
+from ._transfer import COMMENT, FORMATS, POST, RecordWriter, detect_format
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты и комментарии в NDJSON или CSV для import_posts. '
+        'Строки читаются из базы порциями и сразу пишутся в файл'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки (по умолчанию stdout)',
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        format = detect_format(options['output'], options['format'])
+        if options['output'] == '-':
+            self.export(self.stdout, format, options['chunk_size'])
+            return
+        with open(options['output'], 'w', newline='',
+                  encoding='utf-8') as file:
+            posts, comments = self.export(
+                file, format, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено: постов {posts}, комментариев {comments}'))
+
+    def export(self, file, format, chunk_size):
+        writer = RecordWriter(file, format)
+        posts = Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+            'image',
+        )
+        post_count = 0
+        for pk, author, group, text, pub_date, image in posts.iterator(
+                chunk_size=chunk_size):
+            writer.write({
+                'type': POST, 'id': pk, 'author': author, 'group': group,
+                'text': text, 'pub_date': pub_date.isoformat(),
+                'image': image or None,
+            })
+            post_count += 1
+        comments = Comment.objects.order_by('pk').values_list(
+            'pk', 'post_id', 'author__username', 'text', 'pub_date')
+        comment_count = 0
+        for pk, post, author, text, pub_date in comments.iterator(
+                chunk_size=chunk_size):
+            writer.write({
+                'type': COMMENT, 'id': pk, 'post': post, 'author': author,
+                'text': text, 'pub_date': pub_date.isoformat(),
+            })
+            comment_count += 1
+        return post_count, comment_count
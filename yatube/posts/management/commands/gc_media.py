@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from core.storage import blob_storage
+from posts.models import ImageBlob, Post
+
+
+def fingerprint(name):
+    """64 бита хэша имени: множество таких чисел в разы меньше
+    множества строк. Совпадение лишь оставит файл на месте."""
+    return int.from_bytes(
+        hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big')
+
+
+def walk(storage, directory):
+    """Потоком отдаёт (имя, mtime) файлов каталога storage."""
+    stack = [storage.path(directory)]
+    root = storage.path('')
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                name = os.path.relpath(entry.path, root)
+                yield name.replace(os.sep, '/'), entry.stat().st_mtime
+
+
+class Throttle:
+    """Не даёт удалять быстрее rate файлов в секунду (0 - без лимита)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.done = 0
+
+    def __call__(self, count):
+        self.done += count
+        if self.rate:
+            delay = self.done / self.rate - (
+                time.monotonic() - self.started)
+            if delay > 0:
+                time.sleep(delay)
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки без постов, устаревшие записи KV sorl '
+            'и миниатюры, на которые никто не ссылается')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удаляя',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько файлов или записей удалять за раз',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких удалений в секунду, 0 - без лимита',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: их пост '
+                 'может быть ещё не сохранён',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.throttle = Throttle(options['rate'])
+        self.deadline = time.time() - options['min_age']
+        originals = self.collect_originals()
+        known = self.thumbnails_in_posts()
+        records = self.clean_kvstore(known)
+        thumbnails = self.collect_thumbnails(known)
+        prefix = 'Можно удалить' if self.dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}: картинок {originals}, записей KV {records}, '
+            f'миниатюр {thumbnails}'
+        ))
+
+    def batches(self, items):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def orphans(self, storage, directory, referenced):
+        for name, mtime in walk(storage, directory):
+            if mtime < self.deadline and fingerprint(name) not in referenced:
+                yield name
+
+    def collect_originals(self):
+        """Исходные картинки, на которые не ссылается ни один пост.
+
+        Удаляются вместе с миниатюрами и их записями в KV.
+        """
+        referenced = {
+            fingerprint(name) for name in
+            Post.objects.exclude(image='').values_list('image', flat=True)
+            .iterator()
+        }
+        referenced.update(
+            fingerprint(name) for name in
+            ImageBlob.objects.filter(refs__gt=0)
+            .values_list('name', flat=True).iterator()
+        )
+        deleted = 0
+        upload_to = Post._meta.get_field('image').upload_to
+        for batch in self.batches(
+                self.orphans(blob_storage, upload_to, referenced)):
+            # Пока шёл обход, такую же картинку могли загрузить снова.
+            batch = set(batch).difference(
+                Post.objects.filter(image__in=batch)
+                .values_list('image', flat=True))
+            if not self.dry_run:
+                batch = [name for name in batch if self.delete_original(name)]
+                self.throttle(len(batch))
+            deleted += len(batch)
+        return deleted
+
+    def delete_original(self, name):
+        """Удаляет картинку, если ссылок на неё по-прежнему нет.
+
+        Проверяет прямо перед удалением: пока шёл обход, ту же
+        картинку могли загрузить снова, и тогда у неё есть ссылка
+        или свежий mtime.
+        """
+        ImageBlob.objects.filter(name=name, refs__lte=0).delete()
+        if ImageBlob.objects.filter(name=name).exists():
+            return False
+        try:
+            mtime = os.path.getmtime(blob_storage.path(name))
+        except FileNotFoundError:
+            return False
+        if mtime >= self.deadline:
+            return False
+        delete_thumbnails(ImageFile(name, blob_storage))
+        return True
+
+    def thumbnails_in_posts(self):
+        """Отпечатки миниатюр, чьи URL сохранены в Post.thumbnails."""
+        media_url = settings.MEDIA_URL
+        known = set()
+        for thumbnails in (
+                Post.objects.exclude(thumbnails='')
+                .values_list('thumbnails', flat=True).iterator()):
+            for thumbnail in json.loads(thumbnails).values():
+                variants = [thumbnail] + [
+                    variant
+                    for sizes in thumbnail.get('variants', {}).values()
+                    for variant in sizes
+                ]
+                known.update(
+                    fingerprint(variant['url'][len(media_url):])
+                    for variant in variants
+                    if variant['url'].startswith(media_url)
+                )
+        return known
+
+    def kv_rows(self, identity):
+        """Записи KV одного вида по ключу порциями: удалять строки
+        под открытым курсором SQLite нельзя."""
+        prefix = add_prefix('', identity)
+        last = prefix
+        while True:
+            rows = list(
+                KVStore.objects.filter(key__startswith=prefix, key__gt=last)
+                .order_by('key').values_list('key', 'value')
+                [:self.batch_size]
+            )
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def clean_kvstore(self, known):
+        """Удаляет записи KV о файлах, которых больше нет.
+
+        Имена оставшихся записей добавляются в known.
+        """
+        stale = 0
+        for rows in self.kv_rows('image'):
+            missing = []
+            for key, value in rows:
+                image = deserialize_image_file(value)
+                if image.exists():
+                    known.add(fingerprint(image.name))
+                else:
+                    missing.append(image)
+            if not self.dry_run:
+                for image in missing:
+                    # Заодно удаляет миниатюры этой картинки.
+                    default.kvstore.delete(image)
+                self.throttle(len(missing))
+            stale += len(missing)
+        image_prefix = add_prefix('', 'image')
+        for rows in self.kv_rows('thumbnails'):
+            # Списки миниатюр картинок, о которых KV уже не знает.
+            sources = {
+                image_prefix + del_prefix(key): key for key, _ in rows}
+            alive = set(KVStore.objects.filter(
+                key__in=list(sources)).values_list('key', flat=True))
+            keys = [
+                key for source, key in sources.items() if source not in alive
+            ]
+            if not self.dry_run and keys:
+                default.kvstore._delete_raw(*keys)
+                self.throttle(len(keys))
+            stale += len(keys)
+        return stale
+
+    def collect_thumbnails(self, known):
+        """Файлы кэша миниатюр, о которых не знают ни KV, ни посты."""
+        deleted = 0
+        storage = default.storage
+        for batch in self.batches(self.orphans(
+                storage, thumbnail_settings.THUMBNAIL_PREFIX, known)):
+            if not self.dry_run:
+                for name in batch:
+                    storage.delete(name)
+                self.throttle(len(batch))
+            deleted += len(batch)
+        return deleted
@@ -0,0 +1,192 @@
+import itertools
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_generation
+from core.models import explicit_pub_date
+from posts.models import Comment, Group, Post
+from ._transfer import COMMENT, FORMATS, POST, detect_format, read_records
+
+User = get_user_model()
+
+# Сколько значений передавать в один IN (): у SQLite лимит 999.
+LOOKUP_BATCH = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает посты и комментарии из NDJSON или CSV '
+        '(формат export_posts). Пишет bulk_create пачками, коммитит '
+        'порциями и после каждой порции сохраняет контрольную точку, '
+        'с которой --resume продолжит после сбоя. Авторы, которых нет '
+        'в базе, создаются без пароля, группы должны существовать. '
+        'Миниатюры потом готовит generate_thumbnails'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с записями')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько объектов вставлять одним bulk_create',
+        )
+        parser.add_argument(
+            '--transaction-size', type=int, default=50000,
+            help='Сколько записей коммитить одной транзакцией',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию <path>.checkpoint)',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с контрольной точки',
+        )
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересобирать счётчики, ленты и поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = detect_format(path, options['format'])
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = self.load_checkpoint(checkpoint) if options['resume'] else 0
+        self.batch_size = options['batch_size']
+        self.authors = dict(
+            User.objects.values_list('username', 'pk').iterator())
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.counts = {POST: 0, COMMENT: 0}
+
+        with open(path, newline='', encoding='utf-8') as file, \
+                explicit_pub_date(Post, Comment):
+            records = itertools.islice(read_records(file, format), done, None)
+            while True:
+                chunk = list(
+                    itertools.islice(records, options['transaction_size']))
+                if not chunk:
+                    break
+                try:
+                    with transaction.atomic():
+                        self.import_chunk(chunk, done)
+                except IntegrityError as error:
+                    raise CommandError(
+                        f'Записи {done + 1}-{done + len(chunk)}: {error}')
+                done += len(chunk)
+                self.save_checkpoint(checkpoint, done)
+                self.stdout.write(f'Загружено записей: {done}')
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.reset_sequences()
+
+        if not options['no_rebuild']:
+            # bulk_create не вызывает сигналы, как и в seed_bench.
+            for command in ('recount_stats', 'rebuild_timelines',
+                            'rebuild_search_index'):
+                call_command(command, stdout=self.stdout)
+            bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: постов {self.counts[POST]}, '
+            f'комментариев {self.counts[COMMENT]}'
+        ))
+
+    def load_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as file:
+                return json.load(file)['records']
+        except FileNotFoundError:
+            raise CommandError(f'Нет контрольной точки {checkpoint}')
+
+    def save_checkpoint(self, checkpoint, done):
+        # Через временный файл, чтобы сбой не оставил точку пустой.
+        with open(f'{checkpoint}.tmp', 'w') as file:
+            json.dump({'records': done}, file)
+        os.replace(f'{checkpoint}.tmp', checkpoint)
+
+    def import_chunk(self, chunk, offset):
+        self.create_authors({
+            record.get('author') for record in chunk
+        } - self.authors.keys())
+        posts, comments = [], []
+        for number, record in enumerate(chunk, offset + 1):
+            try:
+                if record.get('type', POST) == POST:
+                    posts.append(self.build_post(record))
+                elif record['type'] == COMMENT:
+                    comments.append(self.build_comment(record))
+                else:
+                    raise ValueError(f'неизвестный тип {record["type"]}')
+            except (KeyError, ValueError) as error:
+                raise CommandError(f'Запись {number}: {error}')
+        # Посты раньше комментариев: те могут ссылаться на них.
+        self.bulk_create(Post, posts)
+        self.bulk_create(Comment, comments)
+        self.counts[POST] += len(posts)
+        self.counts[COMMENT] += len(comments)
+
+    def bulk_create(self, model, objects):
+        # Django 2.2 не ограничивает явный batch_size лимитами базы
+        # (у SQLite - 999 параметров на запрос), поэтому здесь.
+        limit = connection.ops.bulk_batch_size(
+            model._meta.concrete_fields, objects)
+        model.objects.bulk_create(
+            objects, batch_size=max(1, min(self.batch_size, limit)))
+
+    def create_authors(self, usernames):
+        usernames = sorted(name for name in usernames if name)
+        if not usernames:
+            return
+        # Хэш один на всех, как в seed_bench: вход только после сброса.
+        password = make_password(None)
+        self.bulk_create(User, [
+            User(username=name, password=password) for name in usernames
+        ])
+        # SQLite не возвращает pk из bulk_create.
+        for start in range(0, len(usernames), LOOKUP_BATCH):
+            self.authors.update(User.objects.filter(
+                username__in=usernames[start:start + LOOKUP_BATCH]
+            ).values_list('username', 'pk'))
+
+    def common_fields(self, record):
+        pub_date = record.get('pub_date')
+        if pub_date:
+            pub_date = parse_datetime(pub_date)
+            if pub_date is None:
+                raise ValueError(f'некорректная дата {record["pub_date"]}')
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date, timezone.utc)
+        return {
+            'pk': record.get('id') or None,
+            'author_id': self.authors[record['author']],
+            'text': record['text'],
+            'pub_date': pub_date or timezone.now(),
+        }
+
+    def build_post(self, record):
+        group = record.get('group')
+        if group and group not in self.groups:
+            raise ValueError(f'нет группы {group}')
+        return Post(
+            group_id=self.groups[group] if group else None,
+            image=record.get('image') or '',
+            **self.common_fields(record),
+        )
+
+    def build_comment(self, record):
+        return Comment(post_id=record['post'], **self.common_fields(record))
+
+    def reset_sequences(self):
+        # Явные id не двигают последовательности PostgreSQL и т. п.
+        sql = connection.ops.sequence_reset_sql(no_style(), [Post, Comment])
+        with connection.cursor() as cursor:
+            for statement in sql:
+                cursor.execute(statement)
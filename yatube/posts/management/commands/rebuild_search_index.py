@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import SearchTerm
+from posts.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов'
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Постингов в индексе: {SearchTerm.objects.count()}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def handle(self, *args, **options):
+        timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        ))
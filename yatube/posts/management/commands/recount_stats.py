@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.images import recount_blobs
+from posts.models import Group, Post
+from posts.stats import recount_authors, recount_groups, recount_posts
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики авторов, групп и постов и ссылки '
+            'на картинки, исправляя расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк пересчитывать за транзакцию',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed_authors = self.recount(User, recount_authors, batch_size)
+        fixed_groups = self.recount(Group, recount_groups, batch_size)
+        fixed_posts = self.recount(Post, recount_posts, batch_size)
+        fixed_blobs = recount_blobs()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: авторов {fixed_authors}, '
+            f'групп {fixed_groups}, постов {fixed_posts}, '
+            f'картинок {fixed_blobs}'
+        ))
+
+    def recount(self, model, recount, batch_size):
+        fixed = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return fixed
+            with transaction.atomic():
+                fixed += recount(ids)
+            last_pk = ids[-1]
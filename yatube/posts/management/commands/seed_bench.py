@@ -0,0 +1,226 @@
+import bisect
+import io
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from core.cache import bump_generation
+from core.models import explicit_pub_date
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+IMAGE_SIZES = ((1280, 720), (960, 960), (720, 1280), (640, 480))
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими данными для бенчмарков: '
+        'пользователи, группы, посты с картинками, комментарии '
+        'и подписки со степенным распределением популярности'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--users', type=int,
+            help='По умолчанию один пользователь на 10 постов',
+        )
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument(
+            '--comments-per-post', type=float, default=2,
+            help='Среднее число комментариев на пост',
+        )
+        parser.add_argument(
+            '--follows-per-user', type=int, default=20,
+            help='Среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.2,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Показатель степенного закона популярности авторов',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench')
+
+    def handle(self, *args, **options):
+        if options['posts'] < 1:
+            raise CommandError('Нужен хотя бы один пост')
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days']).total_seconds()
+        users = options['users'] or max(2, options['posts'] // 10)
+
+        user_ids = self.create_users(users)
+        group_ids = self.create_groups(options['groups'])
+        # Популярные авторы и пишут чаще, и собирают больше подписчиков.
+        weights = list(itertools.accumulate(
+            1 / rank ** options['alpha'] for rank in range(1, users + 1)
+        ))
+        images = self.create_images()
+        with explicit_pub_date(Post, Comment):
+            post_ids = self.create_posts(
+                options['posts'], user_ids, weights, group_ids,
+                images, options['image_ratio'],
+            )
+            self.create_comments(
+                round(options['posts'] * options['comments_per_post']),
+                post_ids, user_ids,
+            )
+        self.create_follows(user_ids, weights, options['follows_per_user'])
+
+        # bulk_create не вызывает сигналы, поэтому производные данные
+        # пересобираются целиком.
+        for command in ('recount_stats', 'rebuild_timelines',
+                        'rebuild_search_index'):
+            call_command(command, stdout=self.stdout)
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(user_ids)}, групп '
+            f'{len(group_ids)}, постов {len(post_ids)}'
+        ))
+
+    def bulk_create(self, model, objects):
+        """Вставляет объекты пачками по batch_size."""
+        objects = iter(objects)
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                return
+            model.objects.bulk_create(batch)
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.random.random() * self.period)
+
+    def create_users(self, count):
+        start = User.objects.filter(
+            username__startswith=self.prefix).count()
+        # Хэш считается один раз: PBKDF2 на каждого занял бы часы.
+        password = make_password(self.prefix)
+        self.bulk_create(User, (
+            User(
+                username=f'{self.prefix}{number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password=password,
+            )
+            for number in range(start, start + count)
+        ))
+        # SQLite не возвращает pk из bulk_create.
+        return list(
+            User.objects.filter(
+                username__startswith=self.prefix
+            ).order_by('pk').values_list('pk', flat=True)[start:]
+        )
+
+    def create_groups(self, count):
+        start = Group.objects.filter(slug__startswith=self.prefix).count()
+        self.bulk_create(Group, (
+            Group(
+                title=self.fake.catch_phrase()[:200],
+                slug=f'{self.prefix}-{number}',
+                description=self.fake.paragraph(),
+            )
+            for number in range(start, start + count)
+        ))
+        return list(
+            Group.objects.filter(
+                slug__startswith=self.prefix
+            ).order_by('pk').values_list('pk', flat=True)[start:]
+        )
+
+    def create_images(self):
+        """Несколько картинок, общих для всех постов."""
+        names = []
+        for number, size in enumerate(IMAGE_SIZES):
+            buffer = io.BytesIO()
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            Image.new('RGB', size, color).save(buffer, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{self.prefix}-{number}.jpg',
+                ContentFile(buffer.getvalue()),
+            ))
+        return names
+
+    def create_posts(self, count, user_ids, weights, group_ids, images,
+                     image_ratio):
+        last_pk = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        total = weights[-1]
+
+        def posts():
+            for _ in range(count):
+                author = bisect.bisect(weights, self.random.random() * total)
+                with_group = group_ids and self.random.random() < 0.7
+                with_image = self.random.random() < image_ratio
+                yield Post(
+                    text=self.fake.text(max_nb_chars=400),
+                    author_id=user_ids[min(author, len(user_ids) - 1)],
+                    group_id=(
+                        self.random.choice(group_ids) if with_group else None
+                    ),
+                    image=self.random.choice(images) if with_image else '',
+                    pub_date=self.random_date(),
+                )
+
+        self.bulk_create(Post, posts())
+        return list(
+            Post.objects.filter(pk__gt=last_pk).values_list('pk', flat=True)
+        )
+
+    def create_comments(self, count, post_ids, user_ids):
+        self.bulk_create(Comment, (
+            Comment(
+                post_id=self.random.choice(post_ids),
+                author_id=self.random.choice(user_ids),
+                text=self.fake.sentence(),
+                pub_date=self.random_date(),
+            )
+            for _ in range(count)
+        ))
+
+    def create_follows(self, user_ids, weights, follows_per_user):
+        total = weights[-1]
+        limit = len(user_ids) - 1
+
+        def follows():
+            for user_id in user_ids:
+                # Число подписок распределено экспоненциально вокруг
+                # среднего, авторы выбираются по весам популярности.
+                wanted = min(limit, int(
+                    self.random.expovariate(1 / follows_per_user)
+                    if follows_per_user > 0 else 0
+                ))
+                authors = set()
+                for _ in range(wanted * 3):
+                    if len(authors) >= wanted:
+                        break
+                    index = bisect.bisect(
+                        weights, self.random.random() * total)
+                    author_id = user_ids[min(index, limit)]
+                    if author_id != user_id:
+                        authors.add(author_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.bulk_create(Follow, follows())
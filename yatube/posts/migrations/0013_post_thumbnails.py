@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(blank=True, editable=False, help_text='JSON с готовыми миниатюрами из POST_THUMBNAILS', verbose_name='Миниатюры'),
+        ),
+    ]
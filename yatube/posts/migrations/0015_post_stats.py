@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostStats',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Post')),
+                ('comments_count', models.IntegerField(default=0, verbose_name='Комментариев')),
+            ],
+        ),
+    ]
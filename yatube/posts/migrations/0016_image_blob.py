@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:52
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_blobs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    ImageBlob.objects.bulk_create(
+        [
+            ImageBlob(name=name, refs=refs)
+            for name, refs in Post.objects.exclude(image='')
+            .order_by().values('image').annotate(refs=Count('pk'))
+            .values_list('image', 'refs')
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('refs', models.IntegerField(default=0, verbose_name='Ссылок')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_blobs, migrations.RunPython.noop),
+    ]
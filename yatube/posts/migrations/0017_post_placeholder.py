@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_image_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False, help_text='data: URI размытой копии картинки', verbose_name='Заглушка'),
+        ),
+    ]
@@ -1,8 +1,14 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models import CharField, UniqueConstraint
+from django.db.models import (CharField, Count, IntegerField, OuterRef,
+                              Subquery, UniqueConstraint)
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 
 from core.models import CreatedModel
+from core.storage import blob_storage
 
 User = get_user_model()
 
@@ -16,6 +22,34 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    def with_comment_count(self):
+        """Добавляет comment_count коррелированным подзапросом.
+
+        Подзапрос выполняется только для выбранных строк, поэтому
+        на странице ленты он дешевле JOIN с GROUP BY.
+        """
+        comments = Comment.objects.filter(
+            post=OuterRef('pk')
+        ).order_by().values('post').annotate(
+            total=Count('pk')
+        ).values('total')
+        return self.annotate(
+            comment_count=Coalesce(
+                Subquery(comments, output_field=IntegerField()), 0
+            )
+        )
+
+    def for_listing(self):
+        """Посты для страниц-лент.
+
+        Автор и группа подтягиваются одним JOIN, число комментариев
+        считается только для строк выбранной страницы.
+        """
+        return self.select_related('author', 'group').with_comment_count()
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='Текст',
@@ -39,15 +73,55 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=blob_storage,
         blank=True
     )
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        editable=False,
+        help_text='JSON с готовыми миниатюрами из POST_THUMBNAILS'
+    )
+    placeholder = models.TextField(
+        'Заглушка',
+        blank=True,
+        editable=False,
+        help_text='data: URI размытой копии картинки'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты читаются по (pub_date DESC, id DESC): возрастающий
+        # индекс, пройденный в обратном порядке, отдаёт строки уже
+        # отсортированными, в том числе при равных pub_date.
+        indexes = [
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date', 'id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['pub_date', 'id'],
+                name='post_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @cached_property
+    def thumbnail_urls(self):
+        """Готовые миниатюры: {'card': {'url': ..., 'width': ...}}."""
+        try:
+            return json.loads(self.thumbnails)
+        except ValueError:
+            return {}
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -64,6 +138,14 @@ class Comment(CreatedModel):
         help_text='Введите текст комментария'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'pub_date', 'id'],
+                name='comment_post_pub_date_idx'
+            ),
+        ]
+
 
 class Follow (models.Model):
     user = models.ForeignKey(
@@ -78,9 +160,131 @@ class Follow (models.Model):
     )
 
     class Meta:
+        # Уникальное ограничение уже даёт индекс (user, author).
         constraints = [
             UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique_following'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост в ленте пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+
+
+class TimelinePullAuthor(models.Model):
+    """Автор, чьи посты собираются в ленты при чтении, а не при записи.
+
+    Сюда попадают авторы со слишком большим числом подписчиков
+    или постов. Отметка не снимается, чтобы ленты оставались полными.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='timeline_pull',
+    )
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора.
+
+    Поддерживаются F()-обновлениями из сигналов, расхождения
+    исправляет команда recount_stats.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField('Постов', default=0)
+    comments_count = models.IntegerField('Комментариев', default=0)
+    followers_count = models.IntegerField('Подписчиков', default=0)
+    following_count = models.IntegerField('Подписок', default=0)
+
+
+class GroupStats(models.Model):
+    """Денормализованные счётчики группы."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField('Постов', default=0)
+
+
+class PostStats(models.Model):
+    """Денормализованные счётчики поста."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    comments_count = models.IntegerField('Комментариев', default=0)
+
+
+class SearchTerm(models.Model):
+    """Постинг инвертированного индекса: терм встречается в посте."""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique_search_term'
+            ),
+        ]
+
+
+class ImageBlob(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются.
+
+    Одинаковые картинки хранятся одним файлом (core.storage), и
+    удалить файл можно, только когда ссылок не осталось.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    refs = models.IntegerField('Ссылок', default=0)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,189 @@
+import re
+from functools import lru_cache
+
+from django.db import transaction
+
+from .models import Post, SearchTerm
+
+TERM_MAX_LENGTH = 64
+BATCH_SIZE = 500
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'^[а-я]+$')
+
+STOP_WORDS = frozenset('''
+    а без более бы был была были было быть в вам вас весь во вот все
+    всего всех вы где да даже для до его ее ей если есть еще же за здесь
+    и из или им их к как какой когда кто ли либо мне может мы на над
+    надо наш не него нее нет ни них но ну о об однако он она они оно от
+    очень по под при с со так также такой там те тем то того тоже той
+    только том ты у уже хотя чего чей чем что чтобы чье эта эти это я
+'''.split())
+
+VOWELS = 'аеиоуыэюя'
+
+
+def _endings(*groups):
+    """Окончания одной группы, от длинных к коротким.
+
+    Первая группа срабатывает только после «а» или «я».
+    """
+    endings = []
+    for needs_a, group in zip((True, False), groups):
+        endings += [(ending, needs_a) for ending in group.split()]
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND = _endings(
+    'в вши вшись',
+    'ив ивши ившись ыв ывши ывшись',
+)
+ADJECTIVE = _endings(
+    '',
+    'ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых '
+    'ую юю ая яя ою ею',
+)
+PARTICIPLE = _endings(
+    'ем нн вш ющ щ',
+    'ивш ывш ующ',
+)
+REFLEXIVE = _endings('', 'ся сь')
+VERB = _endings(
+    'ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно',
+    'ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло ено '
+    'ят ует уют ит ыт ены ить ыть ишь ую ю',
+)
+NOUN = _endings(
+    '',
+    'а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем '
+    'ам ом о у ах иях ях ы ь ию ью ю ия ья я',
+)
+SUPERLATIVE = _endings('', 'ейш ейше')
+DERIVATIONAL = _endings('', 'ост ость')
+
+
+def _regions(word):
+    """Начала областей RV и R2 по алгоритму Snowball."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings):
+    """Снимает самое длинное окончание, целиком лежащее в word[start:].
+
+    Возвращает None, если ни одно окончание не подошло.
+    """
+    for ending, needs_a in endings:
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if needs_a and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            continue
+        return word[:cut]
+    return None
+
+
+def _strip_inflection(word, rv):
+    """Шаг 1: деепричастие или возвратная частица и окончание."""
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    reflexive = _strip(word, rv, REFLEXIVE)
+    if reflexive is not None:
+        word = reflexive
+    adjective = _strip(word, rv, ADJECTIVE)
+    if adjective is not None:
+        participle = _strip(adjective, rv, PARTICIPLE)
+        return adjective if participle is None else participle
+    for endings in (VERB, NOUN):
+        stripped = _strip(word, rv, endings)
+        if stripped is not None:
+            return stripped
+    return word
+
+
+def _tidy_up(word, rv):
+    """Шаг 4: «нн» в «н», превосходная степень, мягкий знак."""
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        if superlative.endswith('нн') and len(superlative) - 2 >= rv:
+            return superlative[:-1]
+        return superlative
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Стеммер Портера (Snowball) для русского языка."""
+    rv, r2 = _regions(word)
+    word = _strip_inflection(word, rv)
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    derivational = _strip(word, r2, DERIVATIONAL)
+    if derivational is not None:
+        word = derivational
+    return _tidy_up(word, rv)
+
+
+def terms(text):
+    """Нормализованные термы текста без повторов и стоп-слов."""
+    found = set()
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS:
+            continue
+        if CYRILLIC.match(word):
+            word = stem(word)
+        found.add(word[:TERM_MAX_LENGTH])
+    return found
+
+
+def index_post(post):
+    """Перестраивает постинги одного поста."""
+    SearchTerm.objects.filter(post=post).delete()
+    postings = [SearchTerm(term=term, post=post) for term in terms(post.text)]
+    SearchTerm.objects.bulk_create(postings, batch_size=BATCH_SIZE)
+
+
+@transaction.atomic
+def rebuild_index():
+    """Перестраивает индекс целиком, пачками по BATCH_SIZE постов."""
+    SearchTerm.objects.all().delete()
+    postings = []
+    for post_id, text in Post.objects.values_list('pk', 'text').iterator():
+        postings += [
+            SearchTerm(term=term, post_id=post_id) for term in terms(text)
+        ]
+        if len(postings) >= BATCH_SIZE:
+            SearchTerm.objects.bulk_create(postings)
+            postings = []
+    SearchTerm.objects.bulk_create(postings)
+
+
+def search_posts(query, queryset=None):
+    """Посты, содержащие все слова запроса в любой словоформе."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    query_terms = terms(query)
+    if not query_terms:
+        return queryset.none()
+    for term in query_terms:
+        queryset = queryset.filter(
+            pk__in=SearchTerm.objects.filter(term=term).values('post_id')
+        )
+    return queryset
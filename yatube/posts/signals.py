@@ -0,0 +1,156 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_generation, purge_surrogate_keys
+from . import images, search, timeline
+from .models import (AuthorStats, Comment, Follow, Group, GroupStats,
+                     Post, PostStats)
+from .stats import bump
+from .surrogate import INDEX, author_key, group_key, post_key
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_fragments(sender, **kwargs):
+    bump_generation()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    timeline.trim(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, raw=False, **kwargs):
+    if instance._state.adding or raw:
+        return
+    instance._previous_group_id, instance._previous_image = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('group_id', 'image').first() or (None, '')
+    )
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        bump(AuthorStats, instance.author_id, posts_count=1)
+        bump(GroupStats, instance.group_id, posts_count=1)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        bump(GroupStats, previous_group_id, posts_count=-1)
+        bump(GroupStats, instance.group_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    bump(AuthorStats, instance.author_id, posts_count=-1)
+    bump(GroupStats, instance.group_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def reference_image(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = '' if created else getattr(instance, '_previous_image', '')
+    if previous != instance.image.name:
+        images.acquire(instance.image.name)
+        images.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    images.release(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(AuthorStats, instance.author_id, comments_count=1)
+        bump(PostStats, instance.post_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    bump(AuthorStats, instance.author_id, comments_count=-1)
+    bump(PostStats, instance.post_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(AuthorStats, instance.author_id, followers_count=1)
+        bump(AuthorStats, instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    bump(AuthorStats, instance.author_id, followers_count=-1)
+    bump(AuthorStats, instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    slugs = Group.objects.filter(
+        pk__in=[instance.group_id,
+                getattr(instance, '_previous_group_id', None)]
+    ).values_list('slug', flat=True)
+    purge_surrogate_keys(
+        INDEX,
+        post_key(instance.pk),
+        author_key(instance.author_id),
+        *map(group_key, slugs),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        purge_surrogate_keys(post_key(instance.post_id))
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, raw=False, **kwargs):
+    if instance._state.adding or raw:
+        return
+    instance._previous_slug = Group.objects.filter(
+        pk=instance.pk
+    ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_group_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        purge_surrogate_keys(
+            group_key(instance.slug),
+            group_key(getattr(instance, '_previous_slug', None)),
+        )
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.db.models import Count, F
+
+from core.cache import get_generation, stale_while_revalidate
+from .models import (AuthorStats, Comment, Follow, GroupStats, Post,
+                     PostStats)
+
+AUTHOR_COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'comments_count': (Comment, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+GROUP_COUNTERS = {
+    'posts_count': (Post, 'group_id'),
+}
+POST_COUNTERS = {
+    'comments_count': (Comment, 'post_id'),
+}
+
+
+def bump(model, pk, **deltas):
+    """Сдвигает счётчики строки одним UPDATE ... SET x = x + delta.
+
+    Отсутствующую строку не создаёт: её соберёт пересчёт при первом
+    чтении (get_*_stats) или recount_stats.
+    """
+    if pk is None:
+        return
+    model.objects.filter(pk=pk).update(**{
+        name: F(name) + delta for name, delta in deltas.items()
+    })
+
+
+def _totals(model, field, ids):
+    return dict(
+        model.objects.filter(**{f'{field}__in': ids})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values_list(field, 'total')
+    )
+
+
+def _recount(stats_model, counters, ids):
+    """Пересчитывает строки ids; возвращает число исправленных."""
+    totals = {
+        name: _totals(model, field, ids)
+        for name, (model, field) in counters.items()
+    }
+    existing = stats_model.objects.in_bulk(ids)
+    to_create, to_update = [], []
+    for pk in ids:
+        values = {name: totals[name].get(pk, 0) for name in counters}
+        stats = existing.get(pk)
+        if stats is None:
+            to_create.append(stats_model(pk=pk, **values))
+        elif any(getattr(stats, name) != value
+                 for name, value in values.items()):
+            for name, value in values.items():
+                setattr(stats, name, value)
+            to_update.append(stats)
+    stats_model.objects.bulk_create(to_create, ignore_conflicts=True)
+    stats_model.objects.bulk_update(to_update, list(counters))
+    return len(to_create) + len(to_update)
+
+
+def recount_authors(ids):
+    return _recount(AuthorStats, AUTHOR_COUNTERS, ids)
+
+
+def recount_groups(ids):
+    return _recount(GroupStats, GROUP_COUNTERS, ids)
+
+
+def recount_posts(ids):
+    return _recount(PostStats, POST_COUNTERS, ids)
+
+
+def get_author_stats(author):
+    try:
+        return author.stats
+    except AuthorStats.DoesNotExist:
+        recount_authors([author.pk])
+        return AuthorStats.objects.get(pk=author.pk)
+
+
+def get_group_stats(group):
+    try:
+        return group.stats
+    except GroupStats.DoesNotExist:
+        recount_groups([group.pk])
+        return GroupStats.objects.get(pk=group.pk)
+
+
+def get_post_stats(post):
+    try:
+        return post.stats
+    except PostStats.DoesNotExist:
+        recount_posts([post.pk])
+        return PostStats.objects.get(pk=post.pk)
+
+
+@stale_while_revalidate(settings.FRAGMENT_CACHE_TIMEOUT,
+                        version=get_generation)
+def get_posts_count():
+    """Число всех постов для паджинатора главной без COUNT(*) на запрос.
+
+    Значение живёт до смены поколения контента; пока один запрос
+    пересчитывает его, остальные получают прежнее.
+    """
+    return Post.objects.count()
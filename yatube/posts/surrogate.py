@@ -0,0 +1,25 @@
+"""Суррогатные ключи страниц для core.page_cache."""
+
+INDEX = 'index'
+
+
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def group_key(slug):
+    return f'group:{slug}' if slug else None
+
+
+def listing_keys(posts):
+    """Ключи постов страницы и групп, названия которых на ней видны."""
+    keys = set()
+    for post in posts:
+        keys.add(post_key(post.pk))
+        if post.group_id:
+            keys.add(group_key(post.group.slug))
+    return keys
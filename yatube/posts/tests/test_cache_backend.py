@@ -0,0 +1,177 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import Client, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core.cache_backends import LocalStore, SQLiteCache, TwoTierCache
+
+THREADS = 4
+INCREMENTS = 50
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    """Класс проверки двухуровневого кэша"""
+
+    def setUp(self):
+        caches['shared'].clear()
+
+    def make_cache(self, process, **options):
+        options = {'SHARED': 'shared', 'SYNC_INTERVAL': 0, **options}
+        return TwoTierCache(f'{self.id()}-{process}', {'OPTIONS': options})
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Повторное чтение обслуживает локальный уровень"""
+
+        cache = self.make_cache('a', SYNC_INTERVAL=60)
+        cache.set('key', {'value': 1})
+        caches['shared'].delete('key')
+        self.assertEqual(cache.get('key'), {'value': 1})
+        stats = cache.stats()
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['local_hit_ratio'], 1)
+
+    def test_shared_tier_fills_local(self):
+        """Промах локального уровня берёт значение из общего"""
+
+        first, second = self.make_cache('a'), self.make_cache('b')
+        first.set('key', 'значение')
+        self.assertEqual(second.get('key'), 'значение')
+        self.assertEqual(second.get('key'), 'значение')
+        self.assertIsNone(second.get('missing'))
+        stats = second.stats()
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(stats['shared_misses'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+
+    def test_invalidation_between_processes(self):
+        """Запись в одном процессе видна другому после сверки поколения"""
+
+        first = self.make_cache('a')
+        second = self.make_cache('b', SYNC_INTERVAL=60)
+        first.set('key', 1)
+        self.assertEqual(second.get('key'), 1)
+        first.set('key', 2)
+        first.delete('other')
+        self.assertEqual(second.get('key'), 1)
+        second.local.next_sync = 0
+        self.assertEqual(second.get('key'), 2)
+
+    def test_invalidation_per_key(self):
+        """Чужая запись сбрасывает локально только свой ключ"""
+
+        first, second = self.make_cache('a'), self.make_cache('b')
+        first.set('key', 1)
+        first.set('other', 1)
+        second.get('key')
+        second.get('other')
+        first.set('other', 2)
+        self.assertEqual(second.get('other'), 2)
+        self.assertEqual(second.get('key'), 1)
+        self.assertEqual(second.stats()['local_hits'], 1)
+
+    def test_lost_journal_clears_local_tier(self):
+        """Если журнал уже обрезан, локальный уровень сбрасывается"""
+
+        first = self.make_cache('a')
+        second = self.make_cache('b', SYNC_INTERVAL=60)
+        first.set('key', 1)
+        self.assertEqual(second.get('key'), 1)
+        first.set('key', 2)
+        caches['shared'].db.execute('DELETE FROM changes')
+        first.set('other', 3)
+        second.local.next_sync = 0
+        self.assertEqual(second.get('key'), 2)
+
+    def test_atomic_operations_use_shared_tier(self):
+        """add и incr выполняет общий уровень"""
+
+        first, second = self.make_cache('a'), self.make_cache('b')
+        self.assertTrue(first.add('lock', True))
+        self.assertFalse(second.add('lock', True))
+        first.set('counter', 1)
+        self.assertEqual(second.incr('counter'), 2)
+        self.assertEqual(first.incr('counter', 5), 7)
+        with self.assertRaises(ValueError):
+            first.incr('missing')
+
+    def test_shared_tier_atomic_between_connections(self):
+        """add и incr атомарны для одновременных соединений"""
+
+        location = caches['shared'].location
+        backends = [
+            SQLiteCache(location, {}) for _ in range(THREADS)]
+        backends[0].set('counter', 0)
+        added = []
+
+        def work(backend):
+            added.append(backend.add('lock', True))
+            for _ in range(INCREMENTS):
+                backend.incr('counter')
+
+        threads = [
+            threading.Thread(target=work, args=(backend,))
+            for backend in backends
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(added.count(True), 1)
+        self.assertEqual(
+            backends[0].get('counter'), THREADS * INCREMENTS)
+
+    def test_add_replaces_expired(self):
+        """add занимает ключ, срок которого истёк"""
+
+        shared = caches['shared']
+        shared.set('lock', 1, 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(shared.get('lock'))
+        self.assertTrue(shared.add('lock', 2))
+        self.assertFalse(shared.add('lock', 3))
+        self.assertEqual(shared.get('lock'), 2)
+
+    def test_local_tier_bounded_by_bytes(self):
+        """Локальный уровень вытесняет старые записи по размеру"""
+
+        cache = self.make_cache('a', MAX_BYTES=1000)
+        for number in range(10):
+            cache.set(f'key{number}', 'x' * 200)
+        self.assertLessEqual(cache.local.size, 1000)
+        self.assertLess(len(cache.local.entries), 10)
+        self.assertIn(cache.make_key('key9'), cache.local.entries)
+        self.assertEqual(cache.get('key0'), 'x' * 200)
+
+    def test_local_ttl(self):
+        """Запись локального уровня истекает по TTL"""
+
+        store = LocalStore(1000)
+        store.set('key', 'значение', 0.01)
+        self.assertEqual(store.get('key'), 'значение')
+        time.sleep(0.02)
+        store.get('key')
+        store.set('other', 'значение', 0)
+        self.assertFalse(store.entries)
+        self.assertEqual(store.size, 0)
+
+    def test_clear_both_tiers(self):
+        """clear очищает оба уровня"""
+
+        first, second = self.make_cache('a'), self.make_cache('b')
+        first.set('key', 1)
+        second.get('key')
+        first.clear()
+        self.assertIsNone(second.get('key'))
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_tier_stats_on_metrics_page(self):
+        """Статистика уровней кэша видна на /metrics/"""
+
+        response = Client().get(reverse('metrics'))
+        self.assertContains(
+            response,
+            'yatube_cache_requests_total{cache="default",tier="local",'
+            'result="hit"}',
+        )
@@ -0,0 +1,335 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import path
+from .. import urls, views
+from ..management.commands._sqlite_load import _write_with_retry
+from ..models import (AuthorStats, Comment, Follow, Group, GroupStats,
+                      Post, PostQuerySet, PostStats, TimelineEntry)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class CheckQueryPlansCommandTest(TestCase):
+    """Класс проверки команды check_query_plans"""
+
+    def test_no_posts(self):
+        """Без постов команде нечего проверять"""
+
+        with self.assertRaises(CommandError):
+            call_command('check_query_plans', stdout=StringIO())
+
+    def create_posts(self):
+        author = User.objects.create_user(username='auth')
+        reader = User.objects.create_user(username='reader')
+        post = Post.objects.create(
+            author=author,
+            text='Тестовая пост',
+            group=Group.objects.create(
+                title='Тестовая группа',
+                slug='test-slug',
+                description='Тестовое описание',
+            )
+        )
+        Comment.objects.create(post=post, author=reader, text='Коммент')
+        Follow.objects.create(user=reader, author=author)
+
+    def test_views_use_indexes(self):
+        """Запросы всех view проходят проверку планов"""
+
+        self.create_posts()
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('Все запросы используют индексы', out.getvalue())
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_sort_without_index_fails(self):
+        """Страница, отсортированная без индекса, не проходит проверку"""
+
+        self.create_posts()
+        err = StringIO()
+
+        def unindexed(queryset):
+            return queryset.order_by('text')
+
+        with mock.patch.object(PostQuerySet, 'for_listing', unindexed):
+            with self.assertRaises(CommandError):
+                call_command(
+                    'check_query_plans', stdout=StringIO(), stderr=err)
+        self.assertIn('posts:index: сортировка страницы без индекса',
+                      err.getvalue())
+
+    def test_every_view_checked(self):
+        """Команда знает о каждом view из posts.urls"""
+
+        self.create_posts()
+        patterns = urls.urlpatterns + [path('new/', views.index, name='new')]
+        with mock.patch.object(urls, 'urlpatterns', patterns):
+            with self.assertRaisesRegex(CommandError, 'posts:new'):
+                call_command('check_query_plans', stdout=StringIO())
+
+
+class RecountStatsCommandTest(TestCase):
+    """Класс проверки команды recount_stats"""
+
+    def test_recount_fixes_drift(self):
+        """Команда исправляет разошедшиеся счётчики"""
+
+        author = User.objects.create_user(username='auth')
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        post = Post.objects.create(author=author, text='Пост', group=group)
+        Comment.objects.create(post=post, author=author, text='Коммент')
+        AuthorStats.objects.update_or_create(
+            author=author, defaults={'posts_count': 7})
+        call_command('recount_stats', batch_size=1, stdout=StringIO())
+        self.assertEqual(AuthorStats.objects.get(author=author).posts_count, 1)
+        self.assertEqual(GroupStats.objects.get(group=group).posts_count, 1)
+        self.assertEqual(PostStats.objects.get(post=post).comments_count, 1)
+
+
+class ImportExportCommandsTest(TestCase):
+    """Класс проверки команд import_posts и export_posts"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='auth')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, name, records):
+        with open(self.path(name), 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return self.path(name)
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'author__username', 'group__slug', 'text', 'pub_date')),
+            list(Comment.objects.order_by('pk').values_list(
+                'pk', 'post_id', 'author__username', 'text', 'pub_date')),
+        )
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка обратно сохраняют посты и комментарии"""
+
+        first = Post.objects.create(
+            author=self.author, text='Первый', group=self.group)
+        second = Post.objects.create(author=self.reader, text='Второй')
+        Comment.objects.create(post=first, author=self.reader, text='Ответ')
+        Comment.objects.create(post=second, author=self.author, text='Ещё')
+        expected = self.snapshot()
+        for name in ('posts.ndjson', 'posts.csv'):
+            with self.subTest(name=name):
+                call_command(
+                    'export_posts', output=self.path(name), chunk_size=1,
+                    stdout=StringIO(),
+                )
+                Post.objects.all().delete()
+                call_command(
+                    'import_posts', self.path(name), batch_size=1,
+                    transaction_size=3, stdout=StringIO(),
+                )
+                self.assertEqual(self.snapshot(), expected)
+                self.assertEqual(
+                    PostStats.objects.get(post=first).comments_count, 1)
+                self.assertEqual(
+                    AuthorStats.objects.get(author=self.author).posts_count,
+                    1,
+                )
+
+    def test_export_to_stdout(self):
+        """Без --output записи уходят в stdout по одной на строку"""
+
+        Post.objects.create(author=self.author, text='Пост')
+        out = StringIO()
+        call_command('export_posts', stdout=out)
+        record = json.loads(out.getvalue())
+        self.assertEqual(
+            (record['type'], record['author'], record['text']),
+            ('post', 'auth', 'Пост'),
+        )
+
+    def test_unknown_authors_created(self):
+        """Незнакомые авторы создаются без пароля"""
+
+        path = self.write('legacy.ndjson', [
+            {'type': 'post', 'id': 10, 'author': 'legacy', 'text': 'Старый',
+             'pub_date': '2015-05-01T10:00:00'},
+            {'type': 'comment', 'post': 10, 'author': 'auth', 'text': 'Да'},
+        ])
+        call_command('import_posts', path, no_rebuild=True, stdout=StringIO())
+        post = Post.objects.get(pk=10)
+        self.assertEqual(post.author.username, 'legacy')
+        self.assertFalse(post.author.has_usable_password())
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.comments.get().author, self.author)
+
+    def test_resume_from_checkpoint(self):
+        """После ошибки загрузка продолжается с контрольной точки"""
+
+        records = [
+            {'id': number, 'author': 'auth', 'text': f'Пост {number}'}
+            for number in range(1, 5)
+        ]
+        records[2]['group'] = 'missing'
+        path = self.write('posts.ndjson', records)
+        with self.assertRaisesMessage(CommandError, 'Запись 3'):
+            call_command(
+                'import_posts', path, transaction_size=2, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertTrue(os.path.exists(f'{path}.checkpoint'))
+        records[2]['group'] = 'test-slug'
+        self.write('posts.ndjson', records)
+        call_command('import_posts', path, transaction_size=2, resume=True,
+                     stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('pk', flat=True)),
+            [1, 2, 3, 4],
+        )
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_duplicate_ids(self):
+        """Занятый id даёт понятную ошибку, а не traceback"""
+
+        post = Post.objects.create(author=self.author, text='Пост')
+        path = self.write('posts.ndjson', [
+            {'id': post.pk, 'author': 'auth', 'text': 'Дубль'}])
+        with self.assertRaisesMessage(CommandError, 'Записи 1-1'):
+            call_command('import_posts', path, stdout=StringIO())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchCommandsTest(TestCase):
+    """Класс проверки команд seed_bench и bench"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self):
+        call_command(
+            'seed_bench', posts=60, users=12, groups=3,
+            follows_per_user=4, image_ratio=0.5, stdout=StringIO(),
+        )
+
+    def test_seed_bench(self):
+        """seed_bench создаёт данные и пересобирает производные"""
+
+        self.seed()
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(User.objects.count(), 12)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 120)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertGreater(
+            len(set(Post.objects.values_list('pub_date', flat=True))), 1)
+        author = Post.objects.first().author
+        self.assertEqual(
+            AuthorStats.objects.get(author=author).posts_count,
+            author.posts.count(),
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_seed_bench_twice(self):
+        """Повторный запуск добавляет данные, а не падает"""
+
+        self.seed()
+        self.seed()
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertEqual(User.objects.count(), 24)
+
+    def test_bench_reports_every_url(self):
+        """bench выдаёт метрики по каждому маршруту и ничего не меняет"""
+
+        self.seed()
+        follows = Follow.objects.count()
+        out = StringIO()
+        call_command('bench', requests=2, warmup=0, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['posts'], 60)
+        self.assertEqual(set(report['urls']), {
+            'index', 'profile', 'post_detail', 'group_list', 'post_create',
+            'post_edit', 'post_comments', 'add_comment', 'follow_index',
+            'search', 'profile_follow', 'profile_unfollow',
+        })
+        for name, result in report['urls'].items():
+            with self.subTest(name=name):
+                self.assertIn(result['status'], (200, 302))
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['queries'], 0)
+        self.assertEqual(report['urls']['index']['status'], 200)
+        self.assertEqual(Follow.objects.count(), follows)
+
+    def test_bench_without_data(self):
+        """Без данных bench падает с понятной ошибкой"""
+
+        with self.assertRaises(CommandError):
+            call_command('bench', stdout=StringIO())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchDbCommandTest(TransactionTestCase):
+    """Класс проверки команды bench_db. Резервная копия базы не
+    снимается изнутри открытой транзакции, поэтому без TestCase."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_bench_db(self):
+        """bench_db сравнивает профили на копии базы"""
+
+        call_command(
+            'seed_bench', posts=30, users=6, groups=2,
+            follows_per_user=2, image_ratio=0, stdout=StringIO(),
+        )
+        comments = Comment.objects.count()
+        out = StringIO()
+        call_command('bench_db', processes=2, seconds=0.2, stdout=out)
+        report = json.loads(out.getvalue())
+        for name in ('default', 'tuned'):
+            with self.subTest(name=name):
+                self.assertGreater(report[name]['reads'], 0)
+                self.assertLessEqual(
+                    report[name]['p50_ms'], report[name]['p99_ms'])
+        self.assertGreater(report['speedup'], 0)
+        self.assertEqual(Comment.objects.count(), comments)
+
+    def test_only_locked_database_retried(self):
+        """Повторяется только «database is locked», прочие ошибки - нет"""
+
+        result = {'retries': 0}
+        db = sqlite3.connect(':memory:', isolation_level=None)
+        with self.assertRaisesRegex(sqlite3.OperationalError, 'no such'):
+            _write_with_retry(db, 'missing', 1, 1, (3, 0), result)
+        self.assertEqual(result['retries'], 0)
@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    """Класс проверки условных GET-запросов к страницам постов"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.author}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_unchanged_page_not_modified(self):
+        """Неизменившаяся страница отдаётся как 304 без запросов к БД"""
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Cookie', response['Vary'])
+                self.assertIn('max-age=0', response['Cache-Control'])
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_for_guests(self):
+        """Анонимам работает и проверка по Last-Modified"""
+
+        response = self.guest_client.get(self.urls[0])
+        response = self.guest_client.get(
+            self.urls[0],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_change_invalidates_etag(self):
+        """После изменения контента страница отдаётся заново"""
+
+        etags = [self.guest_client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(author=self.author, text='Новый пост')
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user_and_page(self):
+        """ETag различается для пользователей и страниц паджинации"""
+
+        url = self.urls[0]
+        guest = self.guest_client.get(url)
+        reader = self.authorized_client.get(url)
+        self.assertNotEqual(guest['ETag'], reader['ETag'])
+        self.assertFalse(reader.has_header('Last-Modified'))
+        self.assertIn('no-cache', reader['Cache-Control'])
+        second_page = self.guest_client.get(url, {'page': 2})
+        self.assertNotEqual(guest['ETag'], second_page['ETag'])
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет ETag профиля, где есть кнопка подписки"""
+
+        url = self.urls[2]
+        etag = self.authorized_client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['following'])
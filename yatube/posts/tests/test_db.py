@@ -0,0 +1,138 @@
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from core.db import retry_on_locked
+from ..models import Post
+
+User = get_user_model()
+
+
+class SqlitePragmasTest(TestCase):
+    """Класс проверки настройки соединений с SQLite"""
+
+    def test_pragmas_applied(self):
+        """Новое соединение получает PRAGMA из SQLITE_PRAGMAS"""
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+
+@override_settings(DB_LOCKED_RETRIES=3, DB_LOCKED_RETRY_DELAY=0)
+class RetryOnLockedTest(SimpleTestCase):
+    """Класс проверки повтора записи при блокировке базы"""
+
+    databases = '__all__'
+
+    def locked_func(self, failures, error='database is locked'):
+        calls = []
+
+        @retry_on_locked
+        def func():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(error)
+            return 'ok'
+        return func, calls
+
+    def test_retries_until_success(self):
+        """Заблокированная запись повторяется и проходит"""
+
+        func, calls = self.locked_func(2)
+        with self.assertLogs('core.db', 'WARNING'):
+            self.assertEqual(func(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_gives_up(self):
+        """После DB_LOCKED_RETRIES повторов ошибка уходит наружу"""
+
+        func, calls = self.locked_func(10)
+        with self.assertLogs('core.db', 'WARNING'):
+            with self.assertRaises(OperationalError):
+                func()
+        self.assertEqual(len(calls), 4)
+
+    def test_other_errors_not_retried(self):
+        """Прочие ошибки базы не повторяются"""
+
+        func, calls = self.locked_func(1, 'no such table: posts_post')
+        with self.assertRaises(OperationalError):
+            func()
+        self.assertEqual(len(calls), 1)
+
+    def test_no_retry_inside_transaction(self):
+        """Во внешней транзакции повторять нечего"""
+
+        func, calls = self.locked_func(1)
+        with mock.patch('core.db.time.sleep') as sleep:
+            with self.assertRaises(OperationalError):
+                with transaction.atomic():
+                    func()
+        sleep.assert_not_called()
+        self.assertEqual(len(calls), 1)
+
+
+# Посты страницы читаются при отрисовке шаблона. Без фрагментного
+# кэша это всегда происходит внутри запроса, а не в тесте после него.
+@override_settings(DATABASE_REPLICAS=['replica'], FRAGMENT_CACHE_TIMEOUT=0)
+class ReplicaRouterTest(TransactionTestCase):
+    """Класс проверки чтения с реплики и прилипания к основной базе"""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='auth')
+        self.client = Client()
+        self.client.force_login(self.author)
+        self.replicate()
+
+    def replicate(self):
+        call_command('replicate_db', stdout=StringIO())
+
+    def index_texts(self, client):
+        response = client.get(reverse('posts:index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_listing_reads_replica(self):
+        """Лента читается с реплики и видит пост после репликации"""
+
+        Post.objects.create(author=self.author, text='Новый пост')
+        guest = Client()
+        self.assertEqual(self.index_texts(guest), [])
+        self.replicate()
+        self.assertEqual(self.index_texts(guest), ['Новый пост'])
+
+    def test_author_sees_own_post(self):
+        """После записи автор читает из основной базы"""
+
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Свой пост'})
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.index_texts(self.client), ['Свой пост'])
+        del self.client.cookies[settings.REPLICA_STICKY_COOKIE]
+        self.assertEqual(self.index_texts(self.client), [])
+
+    def test_writes_go_to_primary(self):
+        """Запись из view реплики не трогает"""
+
+        self.client.post(reverse('posts:post_create'), {'text': 'Пост'})
+        self.assertEqual(Post.objects.using('default').count(), 1)
+        self.assertEqual(Post.objects.using('replica').count(), 0)
+
+    def test_reads_without_writes_not_sticky(self):
+        """Чтение не ставит cookie основной базы"""
+
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
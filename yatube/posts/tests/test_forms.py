@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from hashlib import sha256
 from http import HTTPStatus
 
 from django.conf import settings
@@ -85,11 +86,13 @@ class PostsFormTests(TestCase):
         )
         self.assertRedirects(response, self.url_profile)
         self.assertEqual(Post.objects.count(), post_count + 1)
+        # Картинки хранятся под именем из хэша содержимого.
+        digest = sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 text=self.post.text,
                 group=self.post.group.pk,
-                image='posts/small.gif'
+                image=f'posts/{digest[:2]}/{digest}.gif'
             ).exists()
         )
 
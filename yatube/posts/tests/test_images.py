@@ -0,0 +1,248 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.models import KVStore
+
+from core.storage import blob_storage
+from ..images import collect, recount_blobs
+from ..management.commands import gc_media
+from ..models import ImageBlob, Post
+from ..thumbnails import generate_thumbnails
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name, color=(200, 30, 30)):
+    buffer = BytesIO()
+    Image.new('RGB', (100, 60), color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageDeduplicationTest(TestCase):
+    """Класс проверки хранения картинок по содержимому"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, text, image):
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': text, 'image': image})
+        return Post.objects.get(text=text)
+
+    def test_same_content_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом по хэшу"""
+
+        first = self.create_post('Первый', make_image('first.jpg'))
+        second = self.create_post('Второй', make_image('second.JPG'))
+        with first.image.open() as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        self.assertEqual(
+            first.image.name, f'posts/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(
+            blob_storage.listdir(f'posts/{digest[:2]}')[1],
+            [f'{digest}.jpg'],
+        )
+        self.assertEqual(
+            ImageBlob.objects.get(name=first.image.name).refs, 2)
+
+    def test_storage_save_returns_existing_name(self):
+        """Повторное сохранение не пишет файл заново"""
+
+        first = blob_storage.save('posts/a.txt', ContentFile(b'data'))
+        second = blob_storage.save('posts/b.txt', ContentFile(b'data'))
+        self.assertEqual(first, second)
+
+    def test_storage_save_refreshes_existing_file(self):
+        """Повторное сохранение обновляет mtime для сборки мусора"""
+
+        name = blob_storage.save('posts/a.txt', ContentFile(b'old'))
+        hour_ago = time.time() - 60 * 60
+        os.utime(blob_storage.path(name), (hour_ago, hour_ago))
+        blob_storage.save('posts/b.txt', ContentFile(b'old'))
+        self.assertGreater(
+            os.path.getmtime(blob_storage.path(name)), hour_ago + 60)
+
+    def test_delete_releases_and_collects(self):
+        """Удаление постов снимает ссылки, последний файл удаляется"""
+
+        first = self.create_post('Первый', make_image('first.jpg'))
+        second = self.create_post('Второй', make_image('second.jpg'))
+        name = first.image.name
+        first.delete()
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 1)
+        self.assertFalse(collect(name))
+        self.assertTrue(blob_storage.exists(name))
+        second.delete()
+        # on_commit в TestCase не срабатывает, сборку зовём сами.
+        self.assertTrue(collect(name))
+        self.assertFalse(blob_storage.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_edit_moves_reference(self):
+        """Смена картинки переносит ссылку на новый файл"""
+
+        post = self.create_post('Пост', make_image('old.jpg'))
+        old_name = post.image.name
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Пост', 'image': make_image('new.jpg', (0, 0, 255))},
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(ImageBlob.objects.get(name=old_name).refs, 0)
+        self.assertEqual(
+            ImageBlob.objects.get(name=post.image.name).refs, 1)
+
+    def test_thumbnails_shared(self):
+        """Миниатюры одинаковых картинок - одни и те же файлы"""
+
+        first = self.create_post('Первый', make_image('first.jpg'))
+        second = self.create_post('Второй', make_image('second.jpg'))
+        generate_thumbnails(first.pk)
+        generate_thumbnails(second.pk)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.thumbnails, second.thumbnails)
+
+    def test_recount_blobs(self):
+        """Пересчёт чинит ссылки и собирает файлы без постов"""
+
+        post = self.create_post('Пост', make_image('post.jpg'))
+        orphan = blob_storage.save(
+            'posts/orphan.jpg', make_image('orphan.jpg', (0, 255, 0)))
+        ImageBlob.objects.create(name=orphan, refs=3)
+        ImageBlob.objects.filter(name=post.image.name).delete()
+        self.assertEqual(recount_blobs(), 2)
+        self.assertEqual(
+            ImageBlob.objects.get(name=post.image.name).refs, 1)
+        self.assertFalse(ImageBlob.objects.filter(name=orphan).exists())
+        self.assertFalse(blob_storage.exists(orphan))
+
+
+class GcMediaCommandTest(TestCase):
+    """Класс проверки команды gc_media"""
+
+    def setUp(self):
+        # KV sorl кэширует записи, а одинаковые картинки дают те же ключи.
+        cache.clear()
+        media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        user = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(
+            author=user, text='Пост', image=make_image('post.jpg'))
+        generate_thumbnails(self.post.pk)
+        self.post.refresh_from_db()
+        self.orphan = blob_storage.save(
+            'posts/orphan.jpg', make_image('orphan.jpg', (0, 255, 0)))
+        self.orphan_thumbnail = get_thumbnail(
+            ImageFile(self.orphan, blob_storage), '50x50').name
+        # Запись KV о картинке, файл которой уже удалён руками.
+        lost = blob_storage.save(
+            'posts/lost.jpg', make_image('lost.jpg', (0, 0, 255)))
+        get_thumbnail(ImageFile(lost, blob_storage), '50x50')
+        blob_storage.delete(lost)
+        self.lost_key = ImageFile(lost, blob_storage).key
+        self.stray = default_storage.save(
+            'cache/ab/stray.jpg', make_image('stray.jpg'))
+        hour_ago = time.time() - 2 * 60 * 60
+        for directory, _, files in os.walk(media_root):
+            for name in files:
+                os.utime(os.path.join(directory, name), (hour_ago, hour_ago))
+        self.fresh = blob_storage.save(
+            'posts/fresh.jpg', make_image('fresh.jpg', (9, 9, 9)))
+
+    def test_dry_run(self):
+        """Пробный запуск только считает"""
+
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+        self.assertIn(
+            'Можно удалить: картинок 1, записей KV 1, миниатюр 1',
+            out.getvalue(),
+        )
+        self.assertTrue(blob_storage.exists(self.orphan))
+        self.assertTrue(default_storage.exists(self.stray))
+
+    def test_orphans_deleted(self):
+        """Удаляются файлы без ссылок, их миниатюры и записи KV"""
+
+        out = StringIO()
+        call_command('gc_media', batch_size=1, rate=1000, stdout=out)
+        self.assertIn(
+            'Удалено: картинок 1, записей KV 1, миниатюр 1', out.getvalue())
+        self.assertFalse(blob_storage.exists(self.orphan))
+        self.assertFalse(default_storage.exists(self.orphan_thumbnail))
+        self.assertFalse(default_storage.exists(self.stray))
+        self.assertFalse(KVStore.objects.filter(
+            key__contains=self.lost_key).exists())
+        self.assertTrue(blob_storage.exists(self.fresh))
+        self.assertTrue(blob_storage.exists(self.post.image.name))
+        card = self.post.thumbnail_urls['card']
+        for variant in [card, *card['variants']['webp']]:
+            with self.subTest(url=variant['url']):
+                self.assertTrue(default_storage.exists(
+                    variant['url'][len(settings.MEDIA_URL):]))
+
+    def test_reupload_during_gc_kept(self):
+        """Картинку, загруженную заново во время обхода, gc не удаляет"""
+
+        def reupload():
+            name = blob_storage.save(
+                'posts/again.jpg', make_image('again.jpg', (0, 255, 0)))
+            self.assertEqual(name, self.orphan)
+
+        def reference():
+            ImageBlob.objects.update_or_create(
+                name=self.orphan, defaults={'refs': 1})
+
+        walk = gc_media.walk
+        hour_ago = time.time() - 2 * 60 * 60
+        for change in (reupload, reference):
+            with self.subTest(change=change.__name__):
+                os.utime(blob_storage.path(self.orphan), (hour_ago, hour_ago))
+
+                def walk_and_change(storage, directory):
+                    yield from walk(storage, directory)
+                    # Только после обхода исходных картинок.
+                    if storage is blob_storage:
+                        change()
+
+                with mock.patch.object(gc_media, 'walk', walk_and_change):
+                    call_command('gc_media', stdout=StringIO())
+                self.assertTrue(blob_storage.exists(self.orphan))
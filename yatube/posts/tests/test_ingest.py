@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+from base64 import b64decode
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+ORIENTATION = 0x0112
+CAMERA_MODEL = 0x0110
+
+
+def make_upload(name, size, mode='RGB', format='JPEG', exif=None):
+    buffer = BytesIO()
+    image = Image.new(mode, size, 'red')
+    options = {'exif': exif} if exif is not None else {}
+    image.save(buffer, format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIZE=800)
+class ImageIngestTest(TestCase):
+    """Класс проверки обработки картинок при загрузке"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def stored_image(self, upload):
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Пост', 'image': upload})
+        post = Post.objects.get(text='Пост')
+        return Image.open(post.image.open()), post.image.name
+
+    def test_large_photo_downscaled_and_stripped(self):
+        """Фото уменьшается, поворачивается по EXIF и теряет EXIF"""
+
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        exif[CAMERA_MODEL] = 'Телефон'
+        image, name = self.stored_image(
+            make_upload('photo.jpg', (1600, 1200), exif=exif))
+        self.assertTrue(name.endswith('.jpg'))
+        self.assertEqual(image.size, (600, 800))
+        self.assertEqual(dict(image.getexif()), {})
+        self.assertTrue(image.info.get('progressive'))
+
+    def test_transparent_png_flattened(self):
+        """PNG с прозрачностью становится JPEG на белом фоне"""
+
+        image, name = self.stored_image(
+            make_upload('logo.png', (50, 50), 'RGBA', 'PNG'))
+        self.assertEqual((image.format, image.mode), ('JPEG', 'RGB'))
+        self.assertEqual(image.size, (50, 50))
+
+    @override_settings(POST_IMAGE_FORMAT='WEBP')
+    def test_webp(self):
+        """POST_IMAGE_FORMAT меняет формат хранения"""
+
+        image, name = self.stored_image(make_upload('photo.jpg', (900, 90)))
+        self.assertTrue(name.endswith('.webp'))
+        self.assertEqual((image.format, image.size), ('WEBP', (800, 80)))
+
+    def test_gif_kept(self):
+        """GIF сохраняется без перекодирования"""
+
+        upload = make_upload('anim.gif', (30, 30), 'P', 'GIF')
+        image, name = self.stored_image(upload)
+        self.assertEqual(image.format, 'GIF')
+
+    def test_placeholder(self):
+        """При загрузке считается крошечная заглушка картинки"""
+
+        self.stored_image(make_upload('photo.jpg', (1600, 1200)))
+        placeholder = Post.objects.get(text='Пост').placeholder
+        prefix = 'data:image/jpeg;base64,'
+        self.assertTrue(placeholder.startswith(prefix))
+        image = Image.open(BytesIO(b64decode(placeholder[len(prefix):])))
+        self.assertEqual(image.size, (16, 12))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_rejected(self):
+        """Слишком большая картинка отклоняется формой"""
+
+        form = PostForm(
+            {'text': 'Пост'},
+            {'image': make_upload('huge.jpg', (101, 100))},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'image_too_large')
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from ..models import Post
+
+User = get_user_model()
+
+
+class MetricsMiddlewareTest(TestCase):
+    """Класс проверки сбора метрик запросов"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.guest_client = Client()
+
+    def test_histograms_by_view_name(self):
+        """Метрики запроса попадают в гистограммы по имени view"""
+
+        response = self.guest_client.get(reverse('posts:index'))
+        view = 'posts:index'
+        duration = metrics.registry.get(metrics.REQUEST_DURATION, view)
+        self.assertEqual(duration.count, 1)
+        self.assertGreater(duration.sum, 0)
+        queries = metrics.registry.get(metrics.DB_QUERIES, view)
+        self.assertGreater(queries.sum, 0)
+        templates = metrics.registry.get(metrics.TEMPLATE_DURATION, view)
+        self.assertGreater(templates.sum, 0)
+        self.assertLess(templates.sum, duration.sum)
+        size = metrics.registry.get(metrics.RESPONSE_SIZE, view)
+        self.assertEqual(size.sum, len(response.content))
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_endpoint(self):
+        """/metrics/ отдаёт гистограммы в формате Prometheus"""
+
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram', body)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            body,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            body,
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_endpoint_is_private(self):
+        """Чужим адресам /metrics/ недоступен"""
+
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_endpoint_closed_by_default(self):
+        """Без настроек /metrics/ закрыт даже для localhost"""
+
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_by_token(self):
+        """С верным токеном /metrics/ доступен с любого адреса"""
+
+        url = reverse('metrics')
+        response = self.guest_client.get(
+            url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        response = self.guest_client.get(
+            url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_SLOW_SAMPLE_RATE=1, METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_request_log_contains_sql(self):
+        """Медленный запрос из выборки пишется в лог вместе с SQL"""
+
+        with self.assertLogs('core.slow_requests', 'WARNING') as logs:
+            self.guest_client.get(
+                reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('posts:post_detail', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(METRICS_SLOW_SAMPLE_RATE=0, METRICS_SLOW_REQUEST_MS=0)
+    def test_unsampled_request_not_logged(self):
+        """Запросы вне выборки в лог не попадают"""
+
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('core.slow_requests', 'WARNING'):
+                self.guest_client.get(reverse('posts:index'))
@@ -0,0 +1,202 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.cache import LOCK_SUFFIX
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTest(TestCase):
+    """Класс проверки кэша страниц для анонимов"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.other_author,
+            text='Чужой пост',
+            group=cls.other_group,
+        )
+        cls.url_index = reverse('posts:index')
+        cls.url_group = reverse(
+            'posts:group_list', kwargs={'slug': cls.group.slug})
+        cls.url_other_group = reverse(
+            'posts:group_list', kwargs={'slug': cls.other_group.slug})
+        cls.url_profile = reverse(
+            'posts:profile', kwargs={'username': cls.author})
+        cls.url_other_profile = reverse(
+            'posts:profile', kwargs={'username': cls.other_author})
+        cls.url_post = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk})
+        cls.url_other_post = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.other_post.pk})
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context)
+
+    def assertRendered(self, url):
+        response = self.guest_client.get(url)
+        self.assertIsNotNone(response.context, url)
+
+    def warm_up(self):
+        urls = (
+            self.url_index, self.url_group, self.url_other_group,
+            self.url_profile, self.url_other_profile, self.url_post,
+            self.url_other_post,
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        return urls
+
+    def test_repeated_request_served_from_cache(self):
+        """Повторный запрос анонима не доходит до view"""
+
+        for url in self.warm_up():
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                self.assertCached(url)
+                self.assertEqual(
+                    self.guest_client.get(url).content, first.content)
+
+    def test_surrogate_key_headers(self):
+        """Ответ несёт Surrogate-Key и Cache-Control для прокси"""
+
+        response = self.guest_client.get(self.url_post)
+        self.assertEqual(
+            set(response['Surrogate-Key'].split()),
+            {f'post:{self.post.pk}', f'author:{self.author.pk}',
+             'group:test-slug'},
+        )
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=', response['Cache-Control'])
+        keys = self.guest_client.get(self.url_index)['Surrogate-Key']
+        self.assertIn('index', keys.split())
+        self.assertIn(f'post:{self.other_post.pk}', keys.split())
+
+    def test_authorized_requests_not_cached(self):
+        """Вошедшие пользователи всегда получают свежую страницу"""
+
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.url_index)
+        response = client.get(self.url_index)
+        self.assertIsNotNone(response.context)
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+    def test_fragment_hit_skips_listing_query(self):
+        """Ключи не читают посты, которые взяты из фрагментного кэша"""
+
+        client = Client()
+        client.force_login(self.author)
+        for url in (self.url_index, self.url_group):
+            with self.subTest(url=url):
+                client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                self.assertFalse([
+                    query for query in queries
+                    if 'FROM "posts_post"' in query['sql']
+                    and 'LIMIT' in query['sql']
+                ])
+
+    def test_stale_fragment_not_cached_or_tagged(self):
+        """Страница со старым фрагментом не кэшируется и без ETag"""
+
+        self.guest_client.get(self.url_index)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        lock = make_template_fragment_key('index_page', ['', ''])
+        lock += LOCK_SUFFIX
+        # Фрагмент нового поколения пересчитывает другой запрос.
+        cache.add(lock, True)
+        response = self.guest_client.get(self.url_index)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertFalse(response.has_header('Surrogate-Key'))
+        cache.delete(lock)
+        response = self.guest_client.get(self.url_index)
+        self.assertContains(response, 'Свежий пост')
+        response = self.guest_client.get(
+            self.url_index, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_post_edit_purges_affected_pages(self):
+        """Правка поста сбрасывает только страницы, где он виден"""
+
+        self.warm_up()
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url in (self.url_index, self.url_group, self.url_profile,
+                    self.url_post):
+            with self.subTest(url=url):
+                self.assertRendered(url)
+        for url in (self.url_other_group, self.url_other_profile,
+                    self.url_other_post):
+            with self.subTest(url=url):
+                self.assertCached(url)
+
+    def test_post_group_change_purges_previous_group(self):
+        """Перенос поста в другую группу сбрасывает обе группы"""
+
+        self.warm_up()
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertRendered(self.url_group)
+        response = self.guest_client.get(self.url_other_group)
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_comment_purges_post_pages(self):
+        """Комментарий сбрасывает страницы со счётчиком комментариев"""
+
+        self.warm_up()
+        Comment.objects.create(
+            post=self.post, author=self.other_author, text='Коммент')
+        self.assertRendered(self.url_post)
+        self.assertRendered(self.url_index)
+        self.assertCached(self.url_other_post)
+        self.assertCached(self.url_other_group)
+
+    def test_group_edit_purges_pages_showing_it(self):
+        """Правка группы сбрасывает страницы с её названием"""
+
+        self.warm_up()
+        self.group.title = 'Новое название'
+        self.group.save()
+        for url in (self.url_group, self.url_index, self.url_post,
+                    self.url_profile):
+            with self.subTest(url=url):
+                self.assertRendered(url)
+        self.assertCached(self.url_other_post)
+        self.assertCached(self.url_other_profile)
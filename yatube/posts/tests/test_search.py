@@ -0,0 +1,95 @@
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from ..models import Post, SearchTerm
+from ..search import rebuild_index, search_posts, stem, terms
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    """Класс проверки русского стеммера"""
+
+    def test_stem(self):
+        """Словоформы сводятся к одной основе"""
+
+        cases = {
+            'книгами': 'книг',
+            'красивая': 'красив',
+            'говорили': 'говор',
+            'важнейшими': 'важн',
+            'облачность': 'облачн',
+            'поднявшийся': 'подня',
+        }
+        for word, expected in cases.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_terms_skip_stop_words(self):
+        """Стоп-слова не попадают в индекс, ё заменяется на е"""
+
+        self.assertEqual(terms('И снова ёлки в Python'),
+                         {'снов', 'елк', 'python'})
+
+
+class SearchTest(TestCase):
+    """Класс проверки полнотекстового поиска"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Красивые книги о далёких звёздах',
+        )
+        cls.other = Post.objects.create(
+            author=cls.user,
+            text='Заметки о погоде',
+        )
+
+    def test_search_word_forms(self):
+        """Поиск находит пост по другой словоформе"""
+
+        self.assertEqual(list(search_posts('красивая книга')), [self.post])
+        self.assertEqual(list(search_posts('звезда погода')), [])
+        self.assertEqual(list(search_posts('и в о')), [])
+
+    def test_index_follows_edits(self):
+        """Правка и удаление поста обновляют индекс"""
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Только погода'
+        post.save()
+        self.assertEqual(list(search_posts('книги')), [])
+        self.assertEqual(
+            set(search_posts('погоды')), {self.post, self.other})
+        post.delete()
+        self.assertFalse(SearchTerm.objects.filter(post_id=self.post.pk))
+
+    def test_rebuild_index(self):
+        """Перестроение индекса восстанавливает постинги"""
+
+        SearchTerm.objects.all().delete()
+        rebuild_index()
+        self.assertEqual(list(search_posts('книги')), [self.post])
+
+    def test_search_view(self):
+        """Страница поиска выводит найденные посты с курсором"""
+
+        response = self.client.get(reverse('posts:search'), {'q': 'книгу'})
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.cursor_based)
+        self.assertEqual(list(page_obj), [self.post])
+        self.assertContains(response, self.post.text)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через индекс"""
+
+        admin = site._registry[Post]
+        request = RequestFactory().get('/')
+        queryset, use_distinct = admin.get_search_results(
+            request, Post.objects.all(), 'звёзды')
+        self.assertEqual(list(queryset), [self.post])
+        self.assertFalse(use_distinct)
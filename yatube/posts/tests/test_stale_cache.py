@@ -0,0 +1,118 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import LOCK_SUFFIX, get_or_compute, stale_while_revalidate
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+
+@override_settings(STALE_CACHE_BETA=0, STALE_CACHE_WAIT=0.1)
+class StaleCacheTest(SimpleTestCase):
+    """Класс проверки кэша с защитой от лавины пересчётов"""
+
+    def setUp(self):
+        cache.clear()
+        self.compute = Counter()
+
+    def test_fresh_value_computed_once(self):
+        """До мягкого срока значение считается один раз"""
+
+        for _ in range(3):
+            value = get_or_compute('key', self.compute, 60)
+        self.assertEqual(value, 'значение 1')
+        self.assertEqual(self.compute.calls, 1)
+
+    def test_expired_value_recomputed(self):
+        """После мягкого срока значение пересчитывается"""
+
+        cache.set('key', ('старое', None, time.time() - 1, 0), 60)
+        value = get_or_compute('key', self.compute, 60)
+        self.assertEqual(value, 'значение 1')
+
+    def test_stale_served_while_locked(self):
+        """Пока другой запрос пересчитывает, отдаётся старое значение"""
+
+        get_or_compute('key', self.compute, 60, version=1)
+        cache.add('key' + LOCK_SUFFIX, True)
+        value = get_or_compute('key', self.compute, 60, version=2)
+        self.assertEqual(value, 'значение 1')
+        self.assertEqual(self.compute.calls, 1)
+        cache.delete('key' + LOCK_SUFFIX)
+        value = get_or_compute('key', self.compute, 60, version=2)
+        self.assertEqual(value, 'значение 2')
+
+    def test_lock_released_after_compute(self):
+        """Блокировка снимается и после ошибки пересчёта"""
+
+        def fail():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            get_or_compute('key', fail, 60)
+        self.assertIsNone(cache.get('key' + LOCK_SUFFIX))
+
+    def test_missing_value_waits_then_computes(self):
+        """Без старого значения запрос ждёт и считает сам"""
+
+        cache.add('key' + LOCK_SUFFIX, True)
+        value = get_or_compute('key', self.compute, 60)
+        self.assertEqual(value, 'значение 1')
+
+    @override_settings(STALE_CACHE_BETA=1)
+    def test_probabilistic_early_expiration(self):
+        """Долго считавшееся значение обновляется раньше срока"""
+
+        soft_expires = time.time() + 10
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            # До срока 10 секунд, а считалось значение 30 секунд.
+            cache.set('key', ('старое', None, soft_expires, 30), 60)
+            value = get_or_compute('key', self.compute, 60)
+            self.assertEqual(value, 'значение 1')
+            cache.set('key', ('старое', None, soft_expires, 1), 60)
+            value = get_or_compute('key', self.compute, 60)
+            self.assertEqual(value, 'старое')
+
+    def test_decorator(self):
+        """Декоратор кэширует результат по аргументам"""
+
+        calls = []
+
+        @stale_while_revalidate(60)
+        def square(number):
+            calls.append(number)
+            return number * number
+
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(4), 16)
+        self.assertEqual(calls, [3, 4])
+
+    def test_template_tag(self):
+        """Тег {% cache %} из stale_cache отдаёт старый фрагмент,
+        пока идёт пересчёт новой версии"""
+
+        template = Template(
+            '{% load stale_cache %}'
+            '{% cache 60 fragment page version=generation %}'
+            '{{ text }}{% endcache %}'
+        )
+        render = template.render
+        self.assertEqual(
+            render(Context({'text': 'a', 'page': 1, 'generation': 1})), 'a')
+        self.assertEqual(
+            render(Context({'text': 'b', 'page': 1, 'generation': 1})), 'a')
+        self.assertEqual(
+            render(Context({'text': 'c', 'page': 2, 'generation': 1})), 'c')
+        self.assertEqual(
+            render(Context({'text': 'd', 'page': 1, 'generation': 2})), 'd')
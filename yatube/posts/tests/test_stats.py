@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+from ..models import (AuthorStats, Comment, Follow, Group, GroupStats, Post,
+                      PostStats)
+from ..stats import get_author_stats, get_group_stats, get_post_stats
+
+User = get_user_model()
+
+
+class StatsTest(TestCase):
+    """Класс проверки денормализованных счётчиков"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group_other = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        # Строки счётчиков создаются пересчётом при первом чтении.
+        get_author_stats(self.author)
+        get_author_stats(self.reader)
+        get_group_stats(self.group)
+        get_group_stats(self.group_other)
+
+    def author_stats(self, user):
+        return AuthorStats.objects.get(pk=user.pk)
+
+    def group_stats(self, group):
+        return GroupStats.objects.get(pk=group.pk)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счётчики"""
+
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group)
+        self.assertEqual(self.author_stats(self.author).posts_count, 1)
+        self.assertEqual(self.group_stats(self.group).posts_count, 1)
+        post.group = self.group_other
+        post.save()
+        self.assertEqual(self.group_stats(self.group).posts_count, 0)
+        self.assertEqual(self.group_stats(self.group_other).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.author_stats(self.author).posts_count, 0)
+        self.assertEqual(self.group_stats(self.group_other).posts_count, 0)
+
+    def test_comment_and_follow_counters(self):
+        """Комментарии и подписки меняют счётчики"""
+
+        post = Post.objects.create(author=self.author, text='Пост')
+        get_post_stats(post)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Ок')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.author_stats(self.reader).comments_count, 1)
+        self.assertEqual(PostStats.objects.get(pk=post.pk).comments_count, 1)
+        comment.delete()
+        self.assertEqual(PostStats.objects.get(pk=post.pk).comments_count, 0)
+        self.assertEqual(self.author_stats(self.author).followers_count, 1)
+        self.assertEqual(self.author_stats(self.reader).following_count, 1)
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.author_stats(self.reader).comments_count, 0)
+        self.assertEqual(self.author_stats(self.author).followers_count, 0)
+        self.assertEqual(self.author_stats(self.reader).following_count, 0)
+
+    def test_profile_reads_stored_count(self):
+        """Профиль и паджинатор берут число постов из счётчика"""
+
+        Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(pk=self.author.pk).update(posts_count=42)
+        response = Client().get(
+            reverse('posts:profile', kwargs={'username': 'author'}))
+        self.assertEqual(response.context['page_obj'].paginator.count, 42)
+        self.assertContains(response, 'Всего постов: 42')
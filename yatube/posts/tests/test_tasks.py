@@ -0,0 +1,184 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Task
+from core.tasks import (PRIORITY_HIGH, PRIORITY_LOW, claim, enqueue,
+                        requeue_stale, run_task, work)
+
+CALLS = []
+
+
+def record(value, suffix=''):
+    CALLS.append(f'{value}{suffix}')
+
+
+def fail(value):
+    CALLS.append(value)
+    raise RuntimeError('сбой')
+
+
+def enqueue_nested():
+    enqueue(record, 'вложенная')
+
+
+def enqueue_then_fail():
+    enqueue(record, 'вложенная')
+    raise RuntimeError('сбой')
+
+
+@override_settings(TASK_RETRY_DELAY=10)
+class TaskQueueTest(TestCase):
+    """Класс проверки очереди задач"""
+
+    def setUp(self):
+        CALLS.clear()
+
+    def run_worker(self):
+        out = StringIO()
+        call_command('run_worker', threads=1, once=True, stdout=out)
+        return out.getvalue()
+
+    def test_worker_runs_and_removes_tasks(self):
+        """Воркер выполняет задачу с аргументами и удаляет её"""
+
+        enqueue(record, 'a', suffix='!')
+        enqueue('posts.tests.test_tasks.record', 'b')
+        self.assertIn('Выполнено задач: 2', self.run_worker())
+        self.assertEqual(CALLS, ['a!', 'b'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_priority_order(self):
+        """Задачи выбираются по приоритету, затем по времени"""
+
+        enqueue(record, 'низкий', priority=PRIORITY_LOW)
+        enqueue(record, 'первый')
+        enqueue(record, 'высокий', priority=PRIORITY_HIGH)
+        enqueue(record, 'второй')
+        self.run_worker()
+        self.assertEqual(CALLS, ['высокий', 'первый', 'второй', 'низкий'])
+
+    def test_delayed_task_waits(self):
+        """Отложенная задача не выполняется раньше срока"""
+
+        enqueue(record, 'потом', delay=60)
+        self.run_worker()
+        self.assertEqual(CALLS, [])
+
+    def test_retry_with_backoff(self):
+        """Упавшая задача повторяется позже, пока есть попытки"""
+
+        task = enqueue(fail, 'x', max_attempts=2)
+        self.run_worker()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.PENDING)
+        self.assertEqual(task.attempts, 1)
+        self.assertIn('RuntimeError: сбой', task.last_error)
+        self.assertGreaterEqual(
+            task.run_at, timezone.now() + timedelta(seconds=9))
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        self.run_worker()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(CALLS, ['x', 'x'])
+
+    def test_failed_attempt_rolled_back(self):
+        """Записи упавшей попытки откатываются"""
+
+        task = enqueue(enqueue_then_fail, max_attempts=1)
+        self.run_worker()
+        self.assertEqual(list(Task.objects.values_list('pk', flat=True)),
+                         [task.pk])
+
+    def test_enqueue_follows_transaction(self):
+        """Откат транзакции отменяет поставленную в ней задачу"""
+
+        with transaction.atomic():
+            enqueue(record, 'a')
+            transaction.set_rollback(True)
+        self.assertFalse(Task.objects.exists())
+
+    def test_claim_is_exclusive(self):
+        """Одну задачу получает только один воркер"""
+
+        enqueue(record, 'a')
+        first = claim('first')
+        self.assertEqual(first.status, Task.RUNNING)
+        self.assertEqual(first.attempts, 1)
+        self.assertIsNone(claim('second'))
+
+    @override_settings(TASK_LOCK_TIMEOUT=60)
+    def test_stale_task_requeued(self):
+        """Задача зависшего воркера возвращается в очередь"""
+
+        enqueue(record, 'a')
+        task = claim('dead')
+        Task.objects.filter(pk=task.pk).update(
+            locked_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(), 1)
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        self.assertTrue(run_task(claim('alive')))
+        self.assertEqual(CALLS, ['a'])
+
+    @override_settings(TASK_LOCK_TIMEOUT=60)
+    def test_stale_task_fails_after_max_attempts(self):
+        """Задача, роняющая воркер, не возвращается в очередь вечно"""
+
+        task = enqueue(record, 'a', max_attempts=1)
+        claim('dead')
+        Task.objects.filter(pk=task.pk).update(
+            locked_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIn('TASK_LOCK_TIMEOUT', task.last_error)
+        self.assertIsNone(claim('alive'))
+
+    def test_requeued_task_left_to_new_owner(self):
+        """Воркер, у которого перехватили задачу, не трогает её строку"""
+
+        for func, args in ((enqueue_nested, ()), (fail, ('x',))):
+            with self.subTest(func=func.__name__):
+                enqueue(func, *args)
+                task = claim('slow')
+                Task.objects.filter(pk=task.pk).update(
+                    locked_by='alive', locked_at=timezone.now())
+                with self.assertLogs('core.tasks'):
+                    self.assertFalse(run_task(task))
+                task.refresh_from_db()
+                self.assertEqual(
+                    (task.status, task.locked_by), (Task.RUNNING, 'alive'))
+                self.assertEqual(task.last_error, '')
+                self.assertFalse(Task.objects.filter(
+                    name__endswith='.record').exists())
+                task.delete()
+
+    def test_stop_event(self):
+        """Выставленный stop останавливает цикл воркера"""
+
+        enqueue(record, 'a')
+        stop = threading.Event()
+        stop.set()
+        self.assertEqual(work('worker', stop), 0)
+        self.assertEqual(CALLS, [])
+
+    @override_settings(
+        EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+        TASK_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    )
+    def test_email_sent_by_worker(self):
+        """Письмо уходит из запроса в очередь и отправляется воркером"""
+
+        mail.send_mail('Тема', 'Текст', 'from@example.com',
+                       ['to@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Task.objects.get().priority, PRIORITY_HIGH)
+        self.run_worker()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Тема')
@@ -0,0 +1,135 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from PIL import Image
+from core.models import Task
+from ..models import Post
+from ..thumbnails import generate_thumbnails
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name, size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    """Класс проверки подготовки миниатюр при загрузке"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовая пост',
+            image=make_image('photo.jpg'),
+        )
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_generate_thumbnails(self):
+        """Миниатюры всех размеров сохраняются в посте"""
+
+        generate_thumbnails(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+        card = post.thumbnail_urls['card']
+        self.assertEqual((card['width'], card['height']), (960, 339))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, card['url'])
+
+    def test_variants_in_picture(self):
+        """Варианты ширин и форматов попадают в srcset тега <picture>"""
+
+        generate_thumbnails(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+        variants = post.thumbnail_urls['card']['variants']
+        # 1440 шире исходной картинки в 1200 и не готовится.
+        self.assertEqual(
+            [(v['width'], v['height']) for v in variants['jpeg']],
+            [(480, 170), (960, 339)],
+        )
+        self.assertTrue(variants['webp'][0]['url'].endswith('.webp'))
+        self.assertTrue(post.placeholder.startswith('data:image/jpeg'))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(
+            response,
+            f'<source type="image/webp" srcset="{variants["webp"][0]["url"]}'
+            f' 480w, {variants["webp"][1]["url"]} 960w"',
+        )
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, post.placeholder)
+
+    def test_tag_without_pillow_plugins(self):
+        """Тег не зависит от загруженных плагинов Pillow"""
+
+        variant = {'url': '/media/cache/a.webp', 'width': 480, 'height': 170}
+        post = Post(image='posts/a.jpg', thumbnails=json.dumps({'card': {
+            'url': '/media/cache/a.jpg', 'width': 960, 'height': 339,
+            'variants': {
+                'webp': [variant],
+                'jpeg': [dict(variant, url='/media/cache/a.jpg')],
+            },
+        }}))
+        template = Template('{% load image_tags %}{% post_image post %}')
+        # Как в свежем процессе, который ещё не открывал картинок.
+        with mock.patch.dict(Image.MIME, clear=True):
+            html = template.render(Context({'post': post}))
+        self.assertIn(
+            '<source type="image/webp" srcset="/media/cache/a.webp 480w"',
+            html)
+
+    def test_upload_schedules_task(self):
+        """Загрузка картинки ставит миниатюры в очередь задач"""
+
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой', 'image': make_image('task.jpg')},
+        )
+        post = Post.objects.get(text='С картинкой')
+        self.assertEqual(post.thumbnails, '')
+        self.assertTrue(Task.objects.filter(
+            name='posts.thumbnails.generate_thumbnails').exists())
+        call_command('run_worker', threads=1, once=True, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertIn('card', post.thumbnail_urls)
+
+    def test_without_thumbnails_original_is_used(self):
+        """Пока миниатюр нет, выводится исходная картинка"""
+
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+
+    def test_new_image_resets_thumbnails(self):
+        """Замена картинки сбрасывает устаревшие миниатюры"""
+
+        generate_thumbnails(self.post.pk)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Новый текст', 'image': make_image('new.jpg')},
+        )
+        self.assertEqual(Post.objects.get(pk=self.post.pk).thumbnails, '')
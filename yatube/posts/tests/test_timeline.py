@@ -0,0 +1,123 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse_lazy
+from core.models import Task
+from ..models import Follow, Post, TimelineEntry, TimelinePullAuthor
+from ..timeline import Timeline, TimelineCursorPaginator
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    """Класс проверки материализованной ленты подписок"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Старый пост',
+        )
+        cls.url_follow = reverse_lazy('posts:follow_index')
+        cls.url_profile_follow = reverse_lazy(
+            'posts:profile_follow', kwargs={'username': 'author'})
+        cls.url_profile_unfollow = reverse_lazy(
+            'posts:profile_unfollow', kwargs={'username': 'author'})
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.reader_client.get(self.url_follow)
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту прошлые посты автора"""
+
+        self.reader_client.get(self.url_profile_follow)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.feed(), [self.old_post.pk])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков при записи"""
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=new_post).exists())
+        self.assertEqual(self.feed(), [new_post.pk, self.old_post.pk])
+
+    @override_settings(TIMELINE_INLINE_FANOUT=0)
+    def test_large_fan_out_deferred(self):
+        """Рассылку по множеству подписчиков выполняет воркер"""
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists())
+        self.assertTrue(Task.objects.filter(
+            name='posts.timeline.deliver').exists())
+        call_command('run_worker', threads=1, once=True, stdout=StringIO())
+        self.assertEqual(self.feed(), [new_post.pk, self.old_post.pk])
+
+    def test_unfollow_trims_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+
+        self.reader_client.get(self.url_profile_follow)
+        self.reader_client.get(self.url_profile_unfollow)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_read_on_demand(self):
+        """Посты популярного автора читаются без материализации"""
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertTrue(
+            TimelinePullAuthor.objects.filter(author=self.author).exists())
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists())
+        self.assertEqual(self.feed(), [new_post.pk, self.old_post.pk])
+
+    @override_settings(TIMELINE_BACKFILL_LIMIT=0)
+    def test_prolific_author_read_on_demand(self):
+        """Плодовитый автор не копируется в ленту при подписке"""
+
+        self.reader_client.get(self.url_profile_follow)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [self.old_post.pk])
+
+    def test_pages_merge_entries_and_pull_authors(self):
+        """Страницы ленты сливают записи и посты pull-автора по дате"""
+
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=other)
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelinePullAuthor.objects.create(author=self.author)
+        for number in range(6):
+            Post.objects.create(author=other, text=f'other{number}')
+            Post.objects.create(author=self.author, text=f'author{number}')
+        expected = list(Post.objects.filter(
+            author__in=[other, self.author]
+        ).order_by('-pub_date', '-pk').values_list('pk', flat=True))
+        timeline = Timeline(self.reader)
+        self.assertEqual(timeline.count(), len(expected))
+        self.assertEqual([post.pk for post in timeline[4:8]], expected[4:8])
+        paginator = TimelineCursorPaginator(timeline, 5)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual(
+            [post.pk for page in pages for post in page], expected)
+        previous = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[-2]))
@@ -7,9 +7,13 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse, reverse_lazy
+from core.paginator import Paginator
 from ..models import Post, Group, Comment, Follow
+from ..stats import recount_authors, recount_groups
 
 User = get_user_model()
 
@@ -208,13 +212,24 @@ class PostsPagesTests(TestCase):
         """ Проверяем кэширование главной страницы"""
 
         response = self.authorized_client.get(self.url_index).content
-        self.post.delete()
+        # update() не шлёт сигналов, поэтому фрагмент остаётся в кэше
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
         response_cache = self.authorized_client.get(self.url_index).content
         self.assertEqual(response, response_cache)
         cache.clear()
         response_clear = self.authorized_client.get(self.url_index).content
         self.assertNotEqual(response, response_clear)
 
+    def test_cache_index_invalidated_on_change(self):
+        """ Изменение поста сразу сбрасывает кэш главной страницы"""
+
+        response = self.authorized_client.get(self.url_index).content
+        self.post.delete()
+        response_deleted = self.authorized_client.get(self.url_index).content
+        self.assertNotEqual(response, response_deleted)
+        self.assertNotContains(
+            self.authorized_client.get(self.url_index), self.post.text)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PaginatorViewsTest(TestCase):
@@ -250,6 +265,7 @@ class PaginatorViewsTest(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.user = PaginatorViewsTest.user
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -267,6 +283,16 @@ class PaginatorViewsTest(TestCase):
                 response = self.client.get(rev)
                 self.assertEqual(len(response.context['page_obj']), 10)
 
+    def test_cached_pages_do_not_mix(self):
+        """Страницы ленты кэшируются раздельно"""
+
+        cache.clear()
+        first = self.client.get(self.url_index)
+        second = self.client.get(self.url_index + '?page=2')
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, 'Тестовая пост0')
+        self.assertNotContains(first, 'Тестовая пост0<')
+
     def test_second_page_contains_three_records(self):
         """Тест паджинации 3 постов на второй странице"""
 
@@ -280,8 +306,167 @@ class PaginatorViewsTest(TestCase):
                 response = self.client.get(rev + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 4)
 
+    def test_elided_page_range(self):
+        """Паджинатор выводит соседние и крайние страницы, а не все"""
+
+        paginator = Paginator(range(1000), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, 2, '…', 47, 48, 49, 50, 51, 52, 53, '…', 99, 100],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(2)),
+            [1, 2, 3, 4, 5, '…', 99, 100],
+        )
+        self.assertEqual(
+            list(Paginator(range(30), 10).get_elided_page_range(1)),
+            [1, 2, 3],
+        )
+
+    def test_index_count_not_recomputed(self):
+        """Число постов главной не пересчитывается на каждой странице"""
+
+        self.authorized_client.get(self.url_index)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(self.url_index + '?page=2')
+        self.assertEqual(response.context['page_obj'].paginator.count, 14)
+        self.assertFalse(
+            [query for query in queries if 'COUNT(*)' in query['sql']])
+
+
+class CursorPaginatorViewsTest(TestCase):
+    """Класс проверки курсорной паджинации во views
+    index, group_list, profile
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([
+            Post(
+                author=cls.user,
+                text=f'Тестовая пост{i}',
+                group=cls.group
+            ) for i in range(14)
+        ])
+        cls.urls = [
+            reverse_lazy('posts:index'),
+            reverse_lazy('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse_lazy('posts:profile', kwargs={'username': 'auth'}),
+        ]
+
+    def test_cursor_pages_cover_all_posts(self):
+        """Курсоры next/prev обходят все посты без повторов"""
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(f'{url}?cursor=')
+                first_page = first.context['page_obj']
+                self.assertEqual(len(first_page), 10)
+                self.assertFalse(first_page.has_previous())
+                second = self.client.get(
+                    f'{url}?cursor={first_page.next_cursor}')
+                second_page = second.context['page_obj']
+                self.assertEqual(len(second_page), 4)
+                self.assertFalse(second_page.has_next())
+                pks = [post.pk for post in first_page]
+                pks += [post.pk for post in second_page]
+                self.assertEqual(
+                    pks,
+                    list(Post.objects.order_by(
+                        '-pub_date', '-id').values_list('pk', flat=True))
+                )
+                back = self.client.get(
+                    f'{url}?cursor={second_page.previous_cursor}')
+                self.assertEqual(
+                    [post.pk for post in back.context['page_obj']],
+                    pks[:10]
+                )
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор отдаёт первую страницу"""
+
+        response = self.client.get(f'{self.urls[0]}?cursor=broken')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    @override_settings(PAGINATION_MODE='cursor')
+    def test_cursor_mode_setting(self):
+        """Настройка PAGINATION_MODE включает курсорный режим"""
+
+        response = self.client.get(self.urls[0])
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.cursor_based)
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentPaginationViewsTest(TestCase):
+    """Класс проверки постраничной загрузки комментариев"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(7)
+        ]
+        for reader in readers:
+            Comment.objects.create(
+                post=cls.post, author=reader, text=f'Коммент {reader}')
+        cls.url_post_detail = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_inline(self):
+        """post_detail выводит первую страницу и общее число"""
+
+        response = self.client.get(self.url_post_detail)
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.author.username for comment in comments],
+            [f'reader{i}' for i in range(5)],
+        )
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'Комментарии: 7')
+        self.assertContains(response, 'data-more-comments')
+
+    def test_comments_fragment(self):
+        """Фрагмент отдаёт следующую страницу по курсору"""
+
+        comments = self.client.get(self.url_post_detail).context['comments']
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url, {'cursor': comments.next_cursor})
+        self.assertEqual(
+            [comment.author.username for comment in response.context[
+                'comments']],
+            ['reader5', 'reader6'],
+        )
+        self.assertNotContains(response, 'data-more-comments')
+        self.assertNotContains(response, '<html')
+
+    def test_comment_authors_joined(self):
+        """Авторы комментариев не запрашиваются по одному"""
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url_post_detail)
+        self.assertFalse(
+            [query for query in queries
+             if 'FROM "auth_user" WHERE' in query['sql']
+             and 'posts_comment' not in query['sql']]
+        )
+
+
 class FollowViewTest(TestCase):
     """Класс проверки подписки на авторов"""
 
@@ -381,3 +566,68 @@ class FollowViewTest(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual(self.user_follow_2.follower.count(), 1)
+
+
+class ListingQueryBudgetTest(TestCase):
+    """Класс проверки числа SQL-запросов на страницах-лентах.
+
+    Число запросов не должно зависеть от количества постов
+    на странице (нет N+1 по author, group и комментариям).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([
+            Post(
+                author=cls.user,
+                text=f'Тестовая пост{i}',
+                group=cls.group
+            ) for i in range(12)
+        ])
+        Comment.objects.bulk_create([
+            Comment(post=post, author=cls.reader, text='Коммент')
+            for post in Post.objects.all()
+        ])
+        recount_authors([cls.user.pk])
+        recount_groups([cls.group.pk])
+        cls.budgets = {
+            reverse_lazy('posts:index'): 4,
+            reverse_lazy(
+                'posts:group_list', kwargs={'slug': 'test-slug'}): 4,
+            reverse_lazy('posts:profile', kwargs={'username': 'auth'}): 5,
+            reverse_lazy('posts:follow_index'): 4,
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_listing_query_budget(self):
+        """Ленты укладываются в бюджет запросов"""
+
+        for url, budget in self.budgets.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    '\n'.join(query['sql'] for query in queries)
+                )
+
+    def test_listing_annotates_comment_count(self):
+        """Посты в ленте несут число комментариев"""
+
+        response = self.authorized_client.get(reverse('posts:index'))
+        for post in response.context['page_obj']:
+            self.assertEqual(post.comment_count, 1)
@@ -0,0 +1,80 @@
+import json
+
+from django.conf import settings
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from core.cache import bump_generation, purge_surrogate_keys
+from core.tasks import enqueue
+from .ingest import make_placeholder
+from .models import Post
+from .surrogate import post_key
+
+
+def _describe(image):
+    return {'url': image.url, 'width': image.width, 'height': image.height}
+
+
+def _variants(source, geometry, options):
+    """Миниатюры geometry шириной из POST_IMAGE_WIDTHS по форматам.
+
+    Пропорции те же; ширины больше исходной не нужны, кроме
+    самой geometry, которую шаблон выводит и без srcset.
+    """
+    width, height = map(int, geometry.split('x'))
+    widths = sorted({
+        size for size in settings.POST_IMAGE_WIDTHS
+        if size <= source.width
+    } | {width})
+    return {
+        format.lower(): [
+            _describe(get_thumbnail(
+                source, f'{size}x{round(size * height / width)}',
+                format=format, **options))
+            for size in widths
+        ]
+        for format in settings.POST_IMAGE_VARIANT_FORMATS
+    }
+
+
+def _placeholder(post):
+    """Заглушка для постов, загруженных до её появления."""
+    if post.placeholder:
+        return post.placeholder
+    with post.image.open() as file:
+        image = Image.open(file)
+        image.draft('RGB', (64, 64))
+        return make_placeholder(image)
+
+
+def generate_thumbnails(post_id):
+    """Готовит все миниатюры из POST_THUMBNAILS и сохраняет их в посте.
+
+    У каждой миниатюры есть url, width, height и variants для
+    srcset. Запись идёт только если картинка поста не сменилась,
+    пока миниатюры считались.
+    """
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    thumbnails = {}
+    for name, options in settings.POST_THUMBNAILS.items():
+        options = dict(options)
+        geometry = options.pop('geometry')
+        thumbnails[name] = _describe(
+            get_thumbnail(post.image, geometry, **options))
+        thumbnails[name]['variants'] = _variants(
+            post.image, geometry, options)
+    updated = Post.objects.filter(
+        pk=post_id, image=post.image.name
+    ).update(thumbnails=json.dumps(thumbnails),
+             placeholder=_placeholder(post))
+    if updated:
+        bump_generation()
+        purge_surrogate_keys(post_key(post_id))
+
+
+def schedule_thumbnails(post):
+    """Ставит подготовку миниатюр в очередь задач."""
+    if post.image:
+        enqueue(generate_thumbnails, post.pk)
@@ -0,0 +1,213 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+from core.paginator import NEXT, PREVIOUS, CursorPage, CursorPaginator
+from core.tasks import enqueue
+from .models import Follow, Post, TimelineEntry, TimelinePullAuthor
+
+BATCH_SIZE = 500
+
+
+def _exceeds(queryset, limit):
+    """COUNT(*), который останавливается на limit + 1 строке."""
+    return queryset.values('pk')[:limit + 1].count() > limit
+
+
+def _is_pull_author(author_id):
+    return TimelinePullAuthor.objects.filter(author_id=author_id).exists()
+
+
+def _mark_pull_author(author_id):
+    TimelinePullAuthor.objects.get_or_create(author_id=author_id)
+
+
+def _insert(entries):
+    for start in range(0, len(entries), BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            entries[start:start + BATCH_SIZE], ignore_conflicts=True
+        )
+
+
+def _deliver(post):
+    followers = Follow.objects.filter(author_id=post.author_id)
+    _insert([
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.values_list('user_id', flat=True)
+    ])
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Если подписчиков немного, пост попадает в ленты сразу, иначе
+    рассылка уходит в очередь задач и не задерживает запрос.
+    """
+    if _is_pull_author(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id)
+    if _exceeds(followers, settings.TIMELINE_FANOUT_LIMIT):
+        _mark_pull_author(post.author_id)
+        return
+    if _exceeds(followers, settings.TIMELINE_INLINE_FANOUT):
+        enqueue(deliver, post.pk)
+        return
+    _deliver(post)
+
+
+def deliver(post_id):
+    """Задача очереди: рассылка поста автора с множеством подписчиков."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None and not _is_pull_author(post.author_id):
+        _deliver(post)
+
+
+def backfill(follow):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if _is_pull_author(follow.author_id):
+        return
+    posts = Post.objects.filter(author_id=follow.author_id)
+    if _exceeds(posts, settings.TIMELINE_BACKFILL_LIMIT):
+        _mark_pull_author(follow.author_id)
+        return
+    _insert([
+        TimelineEntry(user_id=follow.user_id, post_id=post_id,
+                      pub_date=pub_date)
+        for post_id, pub_date in posts.values_list('pk', 'pub_date')
+    ])
+
+
+def trim(follow):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+@transaction.atomic
+def rebuild():
+    """Пересобирает все ленты по текущим подпискам.
+
+    Одна транзакция: читатели не видят пустых лент, а SQLite
+    не делает fsync на каждую подписку.
+    """
+    TimelineEntry.objects.all().delete()
+    for follow in Follow.objects.iterator():
+        backfill(follow)
+
+
+class Timeline:
+    """Лента подписок пользователя как последовательность для Paginator.
+
+    Записи TimelineEntry читаются диапазоном по индексу
+    (user, pub_date, post), посты каждого автора из TimelinePullAuthor -
+    по индексу (author, pub_date, id). Из каждого источника берётся
+    не больше постов, чем нужно до конца страницы, и они сливаются
+    без сортировки всей ленты в базе.
+    """
+    ordered = True
+
+    def __init__(self, user, posts=None):
+        self.user = user
+        self.posts = Post.objects.for_listing() if posts is None else posts
+
+    @cached_property
+    def pull_authors(self):
+        return list(Follow.objects.filter(
+            user=self.user, author__timeline_pull__isnull=False
+        ).values_list('author_id', flat=True))
+
+    def _sources(self):
+        """(условие, поле даты, поле id) каждого источника ленты."""
+        yield (Q(timeline_entries__user=self.user),
+               'timeline_entries__pub_date', 'timeline_entries__post_id')
+        for author_id in self.pull_authors:
+            yield Q(author_id=author_id), 'pub_date', 'id'
+
+    def _range(self, condition, date, pk, limit, after, forward):
+        """limit постов источника после (forward) или до ключа after."""
+        # F(), а не строка: по имени связи Django 2.2 добавил бы
+        # сортировку Post.Meta.ordering через лишний JOIN.
+        ordering = [
+            F(name).desc() if forward else F(name).asc()
+            for name in (date, pk)
+        ]
+        if after is not None:
+            pub_date, post_id = after
+            strict, loose = ('lt', 'lte') if forward else ('gt', 'gte')
+            # Диапазон по дате берётся из индекса, условие на id
+            # отсеивает только посты с той же датой.
+            condition &= Q(**{f'{date}__{loose}': pub_date}) & (
+                Q(**{f'{date}__{strict}': pub_date})
+                | Q(**{f'{pk}__{strict}': post_id}))
+        # Одно условие в одном filter(): все части ссылаются
+        # на один JOIN с TimelineEntry.
+        return self.posts.filter(condition).order_by(*ordering)[:limit]
+
+    def page(self, limit, after=None, forward=True):
+        """Первые limit постов ленты в порядке обхода."""
+        posts = {}
+        for source in self._sources():
+            # Пост автора, ставшего pull, мог остаться и в записях.
+            posts.update(
+                (post.pk, post)
+                for post in self._range(*source, limit, after, forward))
+        return sorted(
+            posts.values(), key=lambda post: (post.pub_date, post.pk),
+            reverse=forward,
+        )[:limit]
+
+    def count(self):
+        entries = TimelineEntry.objects.filter(user=self.user)
+        total = entries.count()
+        if self.pull_authors:
+            total += Post.objects.filter(
+                author_id__in=self.pull_authors).count()
+            total -= entries.filter(
+                post__author_id__in=self.pull_authors).count()
+        return total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # Paginator всегда передаёт обе границы.
+            return self.page(index.stop)[index.start:]
+        return self.page(index + 1)[index]
+
+
+class TimelineCursorPaginator(CursorPaginator):
+    """Курсорная паджинация Timeline тем же форматом курсора."""
+
+    def __init__(self, timeline, per_page):
+        super().__init__(timeline.posts, per_page)
+        self.timeline = timeline
+
+    @cached_property
+    def count(self):
+        return self.timeline.count()
+
+    def get_page(self, cursor=None):
+        direction, values = (
+            self.decode_cursor(cursor) if cursor else None) or (NEXT, None)
+        forward = direction == NEXT
+        rows = self.timeline.page(self.per_page + 1, values, forward)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows, self)
+        has_next = more if forward else True
+        has_previous = values is not None if forward else more
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=(
+                self.encode_cursor(rows[-1], NEXT) if has_next else None),
+            previous_cursor=(
+                self.encode_cursor(rows[0], PREVIOUS)
+                if has_previous else None),
+        )
@@ -1,17 +1,49 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.shortcuts import render, get_object_or_404, redirect
+from core.conditional import conditional_page
+from core.db import retry_on_locked
+from core.page_cache import (add_surrogate_keys, cache_anonymous_page,
+                             defer_surrogate_keys)
+from core.paginator import CursorPaginator, paginate
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Comment, Follow
-from django.core.paginator import Paginator
+from .search import search_posts
+from .stats import (get_author_stats, get_group_stats, get_post_stats,
+                    get_posts_count)
+from .surrogate import (INDEX, author_key, group_key, listing_keys,
+                        post_key)
+from .thumbnails import schedule_thumbnails
+from .timeline import Timeline, TimelineCursorPaginator
 
 
+def _following(request, username):
+    """Подписан ли пользователь на автора: кнопка профиля зависит от этого.
+
+    Ответ запоминается в запросе, чтобы ETag и view не спрашивали БД
+    дважды.
+    """
+    if not request.user.is_authenticated:
+        return False
+    known = request.__dict__.setdefault('_following', {})
+    if username not in known:
+        known[username] = Follow.objects.filter(
+            user=request.user,
+            author__username=username
+        ).exists()
+    return known[username]
+
+
+@conditional_page()
+@cache_anonymous_page
 def index(request):
     title = 'Последние обновления на сайте'
     text = 'Главная страница'
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_listing()
+    page_obj = paginate(request, post_list, count=get_posts_count())
+    add_surrogate_keys(request, INDEX)
+    defer_surrogate_keys(request, lambda: listing_keys(page_obj))
 
     context = {
         'posts': post_list,
@@ -22,17 +54,23 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page()
+@cache_anonymous_page
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = get_object_or_404(Group.objects.select_related('stats'),
+                              slug=slug)
     text = 'Вложенная страница'
     title = f'Записи сообщества {group}'
-    post_group = group.posts.all()
-    paginator = Paginator(post_group, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_group = group.posts.for_listing()
+    group_stats = get_group_stats(group)
+    page_obj = paginate(request, post_group,
+                        count=group_stats.posts_count)
+    add_surrogate_keys(request, group_key(group.slug))
+    defer_surrogate_keys(request, lambda: listing_keys(page_obj))
 
     context = {
         'group': group,
+        'group_stats': group_stats,
         'posts': post_group,
         'text': text,
         'title': title,
@@ -41,19 +79,20 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(extra=_following)
+@cache_anonymous_page
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=author)
-    following = (
-        request.user.is_authenticated and Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists())
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    author_stats = get_author_stats(author)
+    posts = Post.objects.for_listing().filter(author=author)
+    following = _following(request, username)
+    page_obj = paginate(request, posts, count=author_stats.posts_count)
+    add_surrogate_keys(request, author_key(author.pk))
+    defer_surrogate_keys(request, lambda: listing_keys(page_obj))
     context = {
         'author': author,
+        'author_stats': author_stats,
         'posts': posts,
         'page_obj': page_obj,
         'following': following,
@@ -61,11 +100,29 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+def _comments_page(post, cursor=None):
+    """Страница комментариев поста от старых к новым, с авторами."""
+    comments = Comment.objects.filter(post=post).select_related('author')
+    return CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, ordering=('pub_date', 'id')
+    ).get_page(cursor)
+
+
+@conditional_page()
+@cache_anonymous_page
 def post_detail(request, post_id):
-    post_id = get_object_or_404(Post.objects.select_related('author'),
-                                id=post_id)
-    author_posts = Post.objects.filter(author_id=post_id.author)
-    comments = Comment.objects.filter(post=post_id)
+    post_id = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group', 'stats'),
+        id=post_id
+    )
+    author_stats = get_author_stats(post_id.author)
+    add_surrogate_keys(
+        request,
+        post_key(post_id.pk),
+        author_key(post_id.author_id),
+        group_key(post_id.group.slug if post_id.group else None),
+    )
+    comments = _comments_page(post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -74,14 +131,48 @@ def post_detail(request, post_id):
         comment.save()
     context = {
         'post_id': post_id,
-        'author_posts': author_posts,
+        'author_stats': author_stats,
+        'post_stats': get_post_stats(post_id),
         'comments': comments,
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional_page()
+@cache_anonymous_page
+def post_comments(request, post_id):
+    """Следующие страницы комментариев фрагментом HTML.
+
+    post_detail выводит первую страницу сам, ссылка «Показать ещё»
+    догружает остальные по курсору.
+    """
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    add_surrogate_keys(request, post_key(post.pk))
+    context = {
+        'post_id': post,
+        'comments': _comments_page(post, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(query, Post.objects.for_listing())
+    page_obj = CursorPaginator(posts, settings.POSTS_PER_PAGE).get_page(
+        request.GET.get('cursor')
+    )
+    context = {
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@retry_on_locked
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -92,6 +183,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            schedule_thumbnails(post)
             return redirect('posts:profile', username=post.author)
     return render(request,
                   'posts/create_post.html',
@@ -99,6 +191,8 @@ def post_create(request):
 
 
 @login_required
+@retry_on_locked
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     is_edit = True
@@ -109,7 +203,11 @@ def post_edit(request, post_id):
     )
     if request.user == post.author and request.method == 'POST':
         if form.is_valid():
-            form.save()
+            post = form.save(commit=False)
+            if 'image' in form.changed_data:
+                post.thumbnails = ''
+                schedule_thumbnails(post)
+            post.save()
             return redirect('posts:post_detail', post_id=post.id)
     elif request.user != post.author:
         return redirect('posts:post_detail', post_id=post.id)
@@ -119,6 +217,8 @@ def post_edit(request, post_id):
 
 
 @login_required
+@retry_on_locked
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -132,15 +232,16 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post = Timeline(request.user)
+    page_obj = paginate(
+        request, post, cursor_paginator=TimelineCursorPaginator)
     context = {'post': post, 'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@retry_on_locked
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user == author:
@@ -150,6 +251,8 @@ def profile_follow(request, username):
 
 
 @login_required
+@retry_on_locked
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
@@ -45,11 +45,13 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,19 +59,35 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Debug toolbar слишком тяжёл для боевой нагрузки, в продакшене
+# метрики собирает core.middleware.MetricsMiddleware.
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
+# Кому отдаются /metrics/: по умолчанию никому. За обратным прокси на
+# той же машине REMOTE_ADDR у любого запроса 127.0.0.1, поэтому туда
+# не стоит вписывать адреса прокси: лучше задать METRICS_TOKEN, и
+# Prometheus будет присылать заголовок Authorization: Bearer <токен>.
+METRICS_ALLOWED_IPS = []
+METRICS_TOKEN = ''
+# Для какой доли запросов запоминать SQL и с какого времени (мс)
+# записывать такой запрос в лог core.slow_requests.
+METRICS_SLOW_SAMPLE_RATE = 0.1
+METRICS_SLOW_REQUEST_MS = 500
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,6 +97,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.cache.fragment_cache',
             ],
         },
     },
@@ -94,9 +113,55 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переиспользуется запросами потока, а не
+        # открывается заново (и заново настраивается) на каждый.
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# PRAGMA каждого нового соединения с SQLite (core.db.configure_sqlite).
+# WAL: читатели не ждут писателя и наоборот, а synchronous=NORMAL
+# в этом режиме не рискует целостностью и делает fsync только
+# на checkpoint. busy_timeout (мс) - сколько ждать чужую запись.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер в КиБ, а не в страницах.
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+}
+# core.db.retry_on_locked: сколько раз повторять транзакцию,
+# отклонённую с «database is locked», и первая задержка в секундах.
+DB_LOCKED_RETRIES = 3
+DB_LOCKED_RETRY_DELAY = 0.05
+
+# Реплики только для чтения - алиасы из DATABASES, которые держит
+# в актуальном виде репликация (для SQLite - команда replicate_db).
+# Пока список пуст, всё читается из default. Собранное по реплике
+# кэшируется, только если она отмечена догнавшей последнее изменение
+# (core.cache.mark_replica_synced; replicate_db делает это сам). Пример:
+#   DATABASES['replica'] = {
+#       'ENGINE': 'django.db.backends.sqlite3',
+#       'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#   }
+#   DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+# Страницы, которые можно читать с реплики (core.middleware.ReplicaMiddleware).
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:follow_index',
+    'posts:post_detail',
+]
+# Сколько секунд после записи клиент читает из default:
+# с запасом больше отставания реплики.
+REPLICA_STICKY_COOKIE = 'primary'
+REPLICA_STICKY_SECONDS = 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -141,7 +206,10 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:main_page'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма уходят в очередь задач, run_worker отправляет их через
+# TASK_EMAIL_BACKEND.
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+TASK_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -149,8 +217,93 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+POSTS_PER_PAGE = 10
+# Комментарии под постом выводятся по курсору, остальные догружаются.
+COMMENTS_PER_PAGE = 20
+
+# 'pages' — номера страниц (OFFSET), 'cursor' — keyset-паджинация
+# по (pub_date, id). Параметр ?cursor= включает её для одного запроса.
+PAGINATION_MODE = 'pages'
+
+# Лента подписок материализуется при публикации поста. Авторы,
+# у которых подписчиков или постов больше лимита, собираются
+# в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = 10000
+# До стольких подписчиков пост раскладывается по лентам в запросе,
+# больше - задачей в очереди.
+TIMELINE_INLINE_FANOUT = 100
+TIMELINE_BACKFILL_LIMIT = 1000
+
+# Фрагменты лент сбрасываются счётчиком поколений при изменении
+# постов, групп и комментариев, поэтому TTL может быть большим.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Миниатюры готовит задача очереди после сохранения поста,
+# шаблоны берут готовые URL из Post.thumbnails.
+POST_THUMBNAILS = {
+    'card': {'geometry': '960x339', 'crop': 'center', 'upscale': True},
+}
+
+# Для srcset каждая миниатюра готовится ещё и шириной из
+# POST_IMAGE_WIDTHS в каждом формате POST_IMAGE_VARIANT_FORMATS.
+# Последний формат идёт в <img>, остальные - в <source> тега
+# post_image. POST_IMAGE_SIZES - атрибут sizes под вёрстку карточки.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_VARIANT_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_SIZES = '(min-width: 1200px) 1140px, 100vw'
+
+# Загруженная картинка (posts.ingest) уменьшается до
+# POST_IMAGE_MAX_SIZE по длинной стороне, теряет EXIF и
+# перекодируется в POST_IMAGE_FORMAT: 'JPEG' (прогрессивный)
+# или 'WEBP'. Картинки больше POST_IMAGE_MAX_PIXELS отклоняются
+# по заголовку, не декодируясь. GIF сохраняется как есть.
+POST_IMAGE_MAX_SIZE = 2048
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POST_IMAGE_FORMAT = 'JPEG'
+POST_IMAGE_QUALITY = 85
+
+# Очередь core.tasks: run_worker запускает TASK_WORKERS потоков,
+# которые опрашивают её раз в TASK_POLL_INTERVAL секунд. Упавшая
+# задача повторяется через TASK_RETRY_DELAY * 2 ** (попытка - 1)
+# секунд, пока не исчерпает TASK_MAX_ATTEMPTS. Задачу, которую
+# воркер держит дольше TASK_LOCK_TIMEOUT, берёт другой.
+TASK_WORKERS = 2
+TASK_POLL_INTERVAL = 1
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_LOCK_TIMEOUT = 60 * 10
+
+# core.cache.get_or_compute: запись живёт timeout * HARD_FACTOR,
+# но после timeout её пересчитывает один запрос, а остальные ждут
+# результата не дольше STALE_CACHE_WAIT секунд, если старого нет.
+STALE_CACHE_HARD_FACTOR = 4
+STALE_CACHE_LOCK_TIMEOUT = 30
+STALE_CACHE_WAIT = 2
+# Чем больше, тем раньше срока начинается пересчёт (XFetch).
+STALE_CACHE_BETA = 1
+
+# Сколько анонимная страница живёт в core.page_cache и в прокси
+# (s-maxage), если её раньше не сбросили по суррогатному ключу.
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Локальный LRU каждого воркера перед общим кэшем в файле SQLite: общий
+# уровень видят все процессы, и внешний сервис для него не нужен.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_BYTES': 32 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 60,
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'shared.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
+# Тестам общий кэш во временном файле и алиас реплики даёт
+# core.testing.TestRunner.
+TEST_RUNNER = 'core.testing.TestRunner'
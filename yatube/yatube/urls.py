@@ -18,6 +18,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics
+
 handler404 = 'core.views.page_not_found'
 
 handler500 = 'core.views.page_500'
@@ -30,6 +32,8 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
+    path('metrics/', metrics, name='metrics'),
 ]
 if settings.DEBUG:
     urlpatterns += static(